@@ -6,10 +6,12 @@ from aiogram import Bot, Dispatcher
 from aiogram.enums import ParseMode
 from aiogram.client.default import DefaultBotProperties
 from aiogram.fsm.storage.memory import MemoryStorage
-from config import BOT_TOKEN
-from db import init_db
+from config import BOT_TOKEN, BOOTSTRAP_ADMIN_IDS
+from crud import backfill_problem_assignees, ensure_bootstrap_admins, user_role_cache, invalidate_admin_ids
+from db import init_db, session_scope
 from handlers import user_router, admin_router, common_router
 from logging_config import setup_logging
+from middlewares.db_mw import DbSessionMiddleware
 from middlewares.role_mw import RoleMiddleware
 from reminders import send_due_reminders, cb_admin_create_akt_by_staff
 import logging
@@ -30,19 +32,33 @@ async def main():
 
     ensure_token()
     await init_db()
+    promoted: list[int] = []
+    async with session_scope() as s:
+        if BOOTSTRAP_ADMIN_IDS:
+            promoted = await ensure_bootstrap_admins(s, BOOTSTRAP_ADMIN_IDS)
+        await backfill_problem_assignees(s)
+    for tg_id in promoted:
+        user_role_cache.invalidate(tg_id)
+    if promoted:
+        invalidate_admin_ids()
     bot = Bot(token=BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
 
     await setup_bot_commands(bot)
 
     scheduler = AsyncIOScheduler(timezone="Europe/Moscow")
 
-    # каждый день в
+    # каждый день в 22:30 по Москве (по часам, а не "через 24 часа" — без дрейфа);
+    # если запуск опоздал внутри работающего процесса (занятый event loop, сон машины) —
+    # выполняем в течение часа, но один раз; после рестарта пропущенный запуск не догоняется:
+    # хранилище задач в памяти, расписание строится заново
     scheduler.add_job(
         send_due_reminders,
         trigger="cron",
         hour=22,
         minute=30,
         args=[bot],
+        coalesce=True,
+        misfire_grace_time=3600,
     )
 
     scheduler.add_job(
@@ -57,13 +73,13 @@ async def main():
     dp = Dispatcher(storage=MemoryStorage())
     dp.message.middleware(RoleMiddleware())
     dp.callback_query.middleware(RoleMiddleware())
+    dp.message.middleware(DbSessionMiddleware())
+    dp.callback_query.middleware(DbSessionMiddleware())
     dp.include_router(common_router)
     dp.include_router(admin_router)
     dp.include_router(user_router)
     await dp.start_polling(bot)
 
-    # # 🔔 Запускаем фоновый шедулер напоминаний
-    # asyncio.create_task(daily_reminder_worker(bot))
 
 if __name__ == "__main__":
     asyncio.run(main())
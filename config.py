@@ -3,6 +3,10 @@ from dotenv import load_dotenv
 load_dotenv()
 BOT_TOKEN=os.getenv('BOT_TOKEN','')
 DB_URL=os.getenv('DB_URL','sqlite+aiosqlite:///./bot.db')
+DB_POOL_SIZE=int(os.getenv('DB_POOL_SIZE','20'))
+DB_MAX_OVERFLOW=int(os.getenv('DB_MAX_OVERFLOW','40'))
+# за PgBouncer ставьте поменьше (например 60) — он сам закрывает простаивающие соединения
+DB_POOL_RECYCLE=int(os.getenv('DB_POOL_RECYCLE','1800'))
 STORAGE_ROOT=os.getenv('STORAGE_ROOT','./storage')
 BOOTSTRAP_ADMIN_IDS=[int(x) for x in os.getenv('BOOTSTRAP_ADMIN_IDS','').replace(' ','').split(',') if x]
 GROUP_CHAT_ID = int(os.getenv("GROUP_CHAT_ID", "0") or 0)
\ No newline at end of file
@@ -1,13 +1,26 @@
 from __future__ import annotations
 from typing import Iterable, Optional, Dict, Any
-from sqlalchemy import select, func, case
+from sqlalchemy import select, func, case, bindparam, delete, insert, exists
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from config import BOOTSTRAP_ADMIN_IDS
 from models import User, Role, Problem, Report, ReportStatus, ReportMedia, MediaType, ProblemList, ProblemStatus, Staff, \
-    ReportDecision, ReportReview
+    ReportDecision, ReportReview, ProblemAssignee, ActEntry, split_assignees
 from typing import List, Tuple
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
+from functools import lru_cache
+from itertools import islice
+from time import monotonic
+
+from utils.parsing import iso_to_date
+from utils.ttl_cache import TTLCache
+
+# роль пользователя для RoleMiddleware: меняется только через set_admin / ensure_bootstrap_admins;
+# сбрасывать — после commit их сессии
+USER_ROLE_TTL = 60.0
+user_role_cache: TTLCache[int, str] = TTLCache(USER_ROLE_TTL)
 
 async def get_or_create_user(session: AsyncSession, *, tg_id: int, username: str | None, first_name: str | None, last_name: str | None) -> User:
     user = await session.get(User, tg_id)
@@ -16,14 +29,25 @@ async def get_or_create_user(session: AsyncSession, *, tg_id: int, username: str
         session.add(user)
     return user
 
-async def ensure_bootstrap_admins(session: AsyncSession, ids: list[int]):
+async def ensure_bootstrap_admins(session: AsyncSession, ids: list[int]) -> list[int]:
+    """
+    Делает пользователей из ids админами. Возвращает id, чья роль изменилась:
+    их кэш ролей и кэш id админов вызывающий код сбрасывает после commit,
+    иначе запрос между сбросом и commit закэширует старые значения.
+    """
+    changed: list[int] = []
     for i in ids:
         user = await session.get(User, i)
         if not user:
             user = User(id=i, role=Role.ADMIN)
             session.add(user)
-        else:
+            changed.append(i)
+        elif user.role != Role.ADMIN:
             user.role = Role.ADMIN
+            changed.append(i)
+    # autoflush выключен — сбрасываем явно, чтобы последующий get() увидел новых админов
+    await session.flush()
+    return changed
 
 async def is_admin(session: AsyncSession, tg_id: int) -> bool:
     u = await session.get(User, tg_id)
@@ -35,6 +59,7 @@ async def set_admin(session: AsyncSession, tg_id: int, make_admin: bool):
         u = User(id=tg_id)
         session.add(u)
     u.role = Role.ADMIN if make_admin else Role.USER
+    # user_role_cache и invalidate_admin_ids() — на вызывающем коде, после commit
 
 async def get_or_create_problem_list(session: AsyncSession, code: str, title: str | None = None) -> ProblemList:
     q = await session.execute(select(ProblemList).where(ProblemList.code == code))
@@ -145,10 +170,45 @@ async def upsert_problems(
         prob.assignees = assignees
         prob.due_date = due_date
 
+    # 4. Пересобираем problem_assignees для списка: одно удаление + одна пачка вставок
+    await session.flush()
+    await session.execute(
+        delete(ProblemAssignee).where(
+            ProblemAssignee.problem_id.in_(select(Problem.id).where(Problem.list_id == plist.id))
+        )
+    )
+    links = [
+        {"problem_id": p.id, "user_tg_id": tg_id}
+        for p in existing.values()
+        for tg_id in dict.fromkeys(p.assignees)
+    ]
+    if links:
+        await session.execute(insert(ProblemAssignee), links)
+
     # коммит снаружи или здесь — на твой вкус
     # здесь можно не коммитить, если выше ты делаешь session.commit()
     return plist
 
+async def backfill_problem_assignees(session: AsyncSession) -> int:
+    """
+    Разовое заполнение problem_assignees из Problem.assignees_raw
+    (для БД, созданных до появления таблицы). Если таблица не пуста — ничего не делает.
+    """
+    if await session.scalar(select(ProblemAssignee.id).limit(1)) is not None:
+        return 0
+
+    rows = await session.execute(
+        select(Problem.id, Problem.assignees_raw).where(Problem.assignees_raw.is_not(None))
+    )
+    links = [
+        {"problem_id": pid, "user_tg_id": tg_id}
+        for pid, raw in rows.all()
+        for tg_id in dict.fromkeys(assignees_from_str(raw))
+    ]
+    if links:
+        await session.execute(insert(ProblemAssignee), links)
+    return len(links)
+
 async def get_problem_by_list_and_number(session: AsyncSession, list_code: str, number: int) -> dict | None:
     q = await session.execute(
         select(
@@ -197,6 +257,18 @@ async def create_report(session: AsyncSession, *, user_id: int, problem_id: int,
     r = Report(user_id=user_id, problem_id=problem_id, user_chat_id=user_chat_id, user_msg_id=user_msg_id)
     session.add(r); await session.flush(); return r
 
+async def get_report_with_problem(session: AsyncSession, report_id: int) -> tuple[Report, Optional[Problem]] | None:
+    """Отчёт и его задача одним запросом (LEFT JOIN)."""
+    q = await session.execute(
+        select(Report, Problem)
+        .outerjoin(Problem, Report.problem_id == Problem.id)
+        .where(Report.id == report_id)
+    )
+    row = q.first()
+    if not row:
+        return None
+    return row[0], row[1]
+
 async def set_report_status(session: AsyncSession, report_id: int, status: ReportStatus, admin_id: int, reason: str | None = None):
     r = await session.get(Report, report_id)
     if not r: return False
@@ -211,16 +283,15 @@ async def user_stats(session: AsyncSession, tg_id: int) -> dict:
     Считаем каждую проблему один раз по её текущему статусу.
     """
 
-    pattern = f"%,{tg_id},%"
-
     q = await session.execute(
         select(
             Problem.status,
             func.count(Problem.id)
-        ).where(
-            Problem.assignees_raw.is_not(None),
-            ("," + Problem.assignees_raw + ",").like(pattern),
-        ).group_by(Problem.status)
+        )
+        # по индексу problem_assignees(user_tg_id), а не LIKE по всей таблице задач
+        .join(ProblemAssignee, ProblemAssignee.problem_id == Problem.id)
+        .where(ProblemAssignee.user_tg_id == tg_id)
+        .group_by(Problem.status)
     )
     rows = q.all()
 
@@ -276,13 +347,24 @@ async def get_problems_for_reminder(
       - статус: IN_PROGRESS или REPORT_SENT
       - days_left в [0, 1, 2, 3]
     """
+    # только нужные колонки, без ORM-объектов Problem/ProblemList (identity map и т.п.)
     stmt = (
-        select(Problem, ProblemList.title, ProblemList.code)
+        select(
+            Problem.id,
+            Problem.number,
+            Problem.title,
+            Problem.due_date,
+            Problem.assignees_raw,
+            ProblemList.title.label("plist_title"),
+            ProblemList.code.label("plist_code"),
+        )
         .join(ProblemList, Problem.list_id == ProblemList.id)
         .where(
             ProblemList.is_closed.is_(False),
             Problem.assignees_raw.isnot(None),
-            Problem.due_date.isnot(None),
+            # окно 0..3 дня — диапазоном по индексу (status, due_date);
+            # даты при загрузке нормализуются в YYYY-MM-DD, так что сравнение строк корректно
+            Problem.due_date.between(today.isoformat(), (today + timedelta(days=3)).isoformat()),
             Problem.status.in_([
                 ProblemStatus.IN_PROGRESS,
                 ProblemStatus.REPORT_SENT,
@@ -291,14 +373,13 @@ async def get_problems_for_reminder(
     )
 
     res = await session.execute(stmt)
-    rows = res.all()  # [(Problem, title, code), ...]
 
     result: List[Dict[str, Any]] = []
 
-    for prob, plist_title, plist_code in rows:
+    for row in res.mappings():
         # разбор due_date
         try:
-            d = datetime.strptime(prob.due_date.strip(), "%Y-%m-%d").date()
+            d = iso_to_date(row["due_date"].strip())
         except Exception:
             # кривая дата — пропускаем
             continue
@@ -307,8 +388,7 @@ async def get_problems_for_reminder(
         if not (0 <= days_left <= 3):
             continue
 
-        # здесь ещё есть активная сессия, можно спокойно дернуть prob.assignees
-        assignees = prob.assignees  # свойство из модели (список int)
+        assignees = list(split_assignees(row["assignees_raw"]))
 
         if not assignees:
             # если в итоге пусто — нет, кому напоминать
@@ -316,75 +396,201 @@ async def get_problems_for_reminder(
 
         result.append(
             {
-                "problem_id": prob.id,
-                "number": prob.number,
-                "title": prob.title,
+                "problem_id": row["id"],
+                "number": row["number"],
+                "title": row["title"],
                 "due_date": d,
                 "days_left": days_left,
                 "assignees": assignees,
-                "plist_title": plist_title,
-                "plist_code": plist_code,
+                "plist_title": row["plist_title"],
+                "plist_code": row["plist_code"],
             }
         )
 
     return result
 
 
-async def upsert_staff(session: AsyncSession, rows: List[Dict[str, Any]]) -> int:
+async def get_problems_for_acts(
+    session: AsyncSession,
+) -> Dict[int, List[Tuple[Problem, ProblemList]]]:
+    """
+    Принятые задачи без сформированного акта, сгруппированные
+    по первому исполнителю из assignees_raw:
+      {tg_id: [(Problem, ProblemList), ...]} — по (code, number).
+
+    Один запрос на все задачи вместо пары запросов на каждого сотрудника;
+    "первый исполнитель" разбирается в Python, а не диалектным SQL.
+    Задачи с уже сформированным актом и задачи, где среди исполнителей
+    нет ни одного сотрудника из Staff, отсекаются в БД — история актов
+    в Python не загружается.
+    """
+    staff_problem_ids = (
+        select(ProblemAssignee.problem_id)
+        .join(Staff, Staff.assignee == ProblemAssignee.user_tg_id)
+    )
+    rows = (await session.execute(
+        select(Problem, ProblemList)
+        .join(ProblemList, Problem.list_id == ProblemList.id)
+        .where(
+            Problem.status == ProblemStatus.ACCEPTED,
+            Problem.assignees_raw.isnot(None),
+            Problem.id.in_(staff_problem_ids),
+            # анти-join по индексу acts.problem_id
+            ~exists(select(ActEntry.id).where(ActEntry.problem_id == Problem.id)),
+        )
+        .order_by(ProblemList.code, Problem.number)
+    )).all()
+
+    by_assignee: Dict[int, List[Tuple[Problem, ProblemList]]] = {}
+    for prob, plist in rows:
+        ids = prob.assignees
+        if ids:
+            by_assignee.setdefault(ids[0], []).append((prob, plist))
+    return by_assignee
+
+
+# строк в одном INSERT ... VALUES: 3 параметра на строку, старый SQLite держит до 999
+STAFF_UPSERT_BATCH = 300
+
+
+async def upsert_staff(session: AsyncSession, rows: Iterable[Tuple[int, str | None, str | None]]) -> int:
     """
     Обновляет/добавляет сотрудников из zakaz.xlsx.
+    rows — кортежи (assignee, post, fio) от parse_staff_xlsx / iter_staff_xlsx.
     Ключ — assignee (Telegram ID).
     Возвращает количество обработанных строк.
     """
     processed = 0
+    dialect_insert = _UPSERT_INSERTS.get(session.get_bind().dialect.name)
+    it = iter(rows)
+
+    while batch := list(islice(it, STAFF_UPSERT_BATCH)):
+        processed += len(batch)
+
+        if dialect_insert is not None:
+            # PostgreSQL / SQLite: пачка одним INSERT ... ON CONFLICT DO UPDATE по staff.assignee;
+            # строка не может обновиться дважды за запрос — повтор ID в пачке схлопываем (побеждает последний)
+            values = {a: {"assignee": a, "post": p, "fio": f} for a, p, f in batch}
+            stmt = dialect_insert(Staff).values(list(values.values()))
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[Staff.assignee],
+                set_={"post": stmt.excluded.post, "fio": stmt.excluded.fio},
+            )
+            await session.execute(stmt)
+            continue
 
-    for r in rows:
-        assignee = int(r["assignee"])
-        post = r.get("post")
-        fio = r.get("fio")
-
-        q = await session.execute(
-            select(Staff).where(Staff.assignee == assignee)
-        )
-        staff = q.scalar_one_or_none()
+        for assignee, post, fio in batch:
+            q = await session.execute(
+                select(Staff).where(Staff.assignee == assignee)
+            )
+            staff = q.scalar_one_or_none()
 
-        if staff is None:
-            staff = Staff(assignee=assignee)
-            session.add(staff)
+            if staff is None:
+                staff = Staff(assignee=assignee)
+                session.add(staff)
 
-        staff.post = post
-        staff.fio = fio
-        processed += 1
+            staff.post = post
+            staff.fio = fio
+            # autoflush выключен — повторный assignee в файле должен найти эту запись
+            await session.flush()
 
     await session.commit()
     return processed
 
+# запросы на горячем пути собираем один раз; значения — через bindparam
+_STMT_TOPIC_ID = select(ProblemList.group_topic_id).where(ProblemList.code == bindparam("code"))
+_STMT_ADMIN_IDS = select(User.id).where(User.role == Role.ADMIN)
+
+# тема группы для списка задаётся один раз при загрузке списка, а читается на каждом отчёте
+GROUP_TOPIC_TTL = 60.0
+_group_topic_cache: dict[str, tuple[float, int | None]] = {}
+
+
+def invalidate_group_topic(list_code: str) -> None:
+    _group_topic_cache.pop(list_code, None)
+
+
+async def get_group_topic_id(session: AsyncSession, list_code: str) -> int | None:
+    now = monotonic()
+    cached = _group_topic_cache.get(list_code)
+    if cached is not None and now - cached[0] < GROUP_TOPIC_TTL:
+        return cached[1]
+
+    topic_id = await session.scalar(_STMT_TOPIC_ID, {"code": list_code})
+    topic_id = int(topic_id) if topic_id else None
+    _group_topic_cache[list_code] = (now, topic_id)
+    return topic_id
+
+
+# открытые списки пользователя для меню (заполняется в handlers/user.py);
+# сбрасывается при смене статуса его задач
+USER_LISTS_TTL = 15.0
+user_lists_cache: TTLCache[int, list[str]] = TTLCache(USER_LISTS_TTL)
+
+# готовый текст статистики пользователя (заполняется в handlers/user.py);
+# сбрасывается там же, где и user_lists_cache
+USER_STATS_TTL = 10.0
+user_stats_cache: TTLCache[int, str] = TTLCache(USER_STATS_TTL)
+
+
 #____________CRUD-утилиты для голосов
 
-async def get_admin_ids(session: AsyncSession) -> list[int]:
-    rows = await session.execute(
-        select(User.id).where(User.role == Role.ADMIN)
-    )
-    return list(rows.scalars().all())
+# id админов меняются редко (назначение/снятие админа), а читаются на каждом клике
+ADMIN_IDS_TTL = 60.0
+# один ключ (None): при пачке одновременных промахов SELECT выполняет только первый
+_admin_ids_cache: TTLCache[None, frozenset[int]] = TTLCache(ADMIN_IDS_TTL)
 
 
-def split_admins(all_ids: list[int]) -> tuple[set[int], set[int]]:
+def invalidate_admin_ids() -> None:
+    # вызывать после commit изменения ролей, а не внутри его сессии
+    _admin_ids_cache.invalidate(None)
+
+
+async def get_admin_ids(session: AsyncSession) -> frozenset[int]:
+    async def load() -> frozenset[int]:
+        return frozenset(await session.scalars(_STMT_ADMIN_IDS))
+
+    return await _admin_ids_cache.get_or_load(None, load)
+
+
+@lru_cache(maxsize=16)
+def split_admins(all_ids: frozenset[int]) -> tuple[frozenset[int], frozenset[int]]:
     """
     Возвращает (regular_admins, main_admins)
     """
-    main = set(BOOTSTRAP_ADMIN_IDS)
-    all_set = set(all_ids)
-    main_real = all_set & main
-    regular = all_set - main_real
+    main = frozenset(BOOTSTRAP_ADMIN_IDS)
+    main_real = all_ids & main
+    regular = all_ids - main_real
     return regular, main_real
 
 
+_UPSERT_INSERTS = {
+    "postgresql": pg_insert,
+    "sqlite": sqlite_insert,
+}
+
+
 async def upsert_review(
     session: AsyncSession,
     report_id: int,
     admin_tg_id: int,
     decision: ReportDecision,
 ) -> None:
+    # PostgreSQL / SQLite: один INSERT ... ON CONFLICT DO UPDATE по uix_report_admin
+    dialect_insert = _UPSERT_INSERTS.get(session.get_bind().dialect.name)
+    if dialect_insert is not None:
+        stmt = dialect_insert(ReportReview).values(
+            report_id=report_id,
+            admin_id=admin_tg_id,
+            decision=decision,
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[ReportReview.report_id, ReportReview.admin_id],
+            set_={"decision": stmt.excluded.decision},
+        )
+        await session.execute(stmt)
+        return
+
     row = await session.execute(
         select(ReportReview).where(
             ReportReview.report_id == report_id,
@@ -401,6 +607,8 @@ async def upsert_review(
         session.add(rr)
     else:
         rr.decision = decision
+    # голос должен быть виден следующему запросу (get_review_flags) — autoflush выключен
+    await session.flush()
 
 
 async def has_any_rejection(session: AsyncSession, report_id: int) -> bool:
@@ -413,6 +621,44 @@ async def has_any_rejection(session: AsyncSession, report_id: int) -> bool:
     return q.scalar_one_or_none() is not None
 
 
+async def get_review_flags(
+    session: AsyncSession,
+    report_id: int,
+    regular_ids: set[int],
+) -> tuple[bool, bool]:
+    """
+    Одним запросом возвращает (has_rejection, all_regular_approved):
+      - has_rejection — есть ли по отчёту хотя бы один REJECTED;
+      - all_regular_approved — все обычные админы из regular_ids
+        проголосовали APPROVED (True, если обычных админов нет).
+    """
+    q = await session.execute(
+        select(
+            func.coalesce(
+                func.sum(case((ReportReview.decision == ReportDecision.REJECTED, 1), else_=0)),
+                0,
+            ),
+            func.coalesce(
+                func.sum(
+                    case(
+                        (
+                            ReportReview.admin_id.in_(regular_ids)
+                            & (ReportReview.decision == ReportDecision.APPROVED),
+                            1,
+                        ),
+                        else_=0,
+                    )
+                ),
+                0,
+            ),
+        ).where(ReportReview.report_id == report_id)
+    )
+    rejected, regular_approved = q.one()
+    has_rejection = rejected > 0
+    # один админ — один голос (uix_report_admin), поэтому хватает сравнения количества
+    return has_rejection, not has_rejection and regular_approved == len(regular_ids)
+
+
 async def all_regular_approved(
     session: AsyncSession,
     report_id: int,
@@ -425,26 +671,5 @@ async def all_regular_approved(
     if not regular_ids:
         return True
 
-    # кто из обычных админов голосовал approved
-    rows = await session.execute(
-        select(ReportReview.admin_id).where(
-            ReportReview.report_id == report_id,
-            ReportReview.admin_id.in_(regular_ids),
-            ReportReview.decision == ReportDecision.APPROVED,
-        )
-    )
-    approved = set(rows.scalars().all())
-
-    if approved != regular_ids:
-        return False
-
-    # проверяем, нет ли среди них reject
-    rows2 = await session.execute(
-        select(ReportReview.admin_id).where(
-            ReportReview.report_id == report_id,
-            ReportReview.admin_id.in_(regular_ids),
-            ReportReview.decision == ReportDecision.REJECTED,
-        )
-    )
-    rejected = set(rows2.scalars().all())
-    return len(rejected) == 0
\ No newline at end of file
+    _, approved = await get_review_flags(session, report_id, regular_ids)
+    return approved
@@ -1,10 +1,40 @@
 
 from contextlib import asynccontextmanager
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
-from config import DB_URL
+from config import DB_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_RECYCLE
 from models import Base
-engine = create_async_engine(DB_URL, echo=False, future=True)
-SessionLocal: async_sessionmaker[AsyncSession] = async_sessionmaker(engine, expire_on_commit=False)
+
+def _pool_kwargs(url: str) -> dict:
+    # у SQLite (по умолчанию) один файл на процесс — пул оставляем как есть
+    if url.startswith("sqlite"):
+        return {}
+    # серверная БД: запас соединений под пачки одновременных нажатий;
+    # мёртвые соединения отсекаем по возрасту, а не SELECT 1 перед каждым checkout;
+    # LIFO отдаёт самое "тёплое" соединение, а лишние простаивают и уходят по recycle
+    kwargs = {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": False,
+        "pool_use_lifo": True,
+        "pool_timeout": 30,
+    }
+    if url.startswith("postgresql+asyncpg"):
+        # одни и те же SELECT'ы на каждом нажатии: держим подготовленные
+        # выражения asyncpg на соединении, а не парсим SQL заново
+        kwargs["connect_args"] = {
+            "prepared_statement_cache_size": 256,
+            "statement_cache_size": 1024,
+        }
+    return kwargs
+
+# query_cache_size — кэш скомпилированных SQLAlchemy выражений (по умолчанию 500)
+# insertmanyvalues_page_size — сколько строк executemany-INSERT (акты, задачи) уходит одним запросом
+engine = create_async_engine(
+    DB_URL, echo=False, future=True, query_cache_size=1200,
+    insertmanyvalues_page_size=1000, **_pool_kwargs(DB_URL),
+)
+SessionLocal: async_sessionmaker[AsyncSession] = async_sessionmaker(engine, expire_on_commit=False, autoflush=False)
 async def init_db():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
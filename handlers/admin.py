@@ -1,29 +1,34 @@
+import asyncio
 import io
+import logging
 import os
+import tempfile
 from collections import defaultdict
-from docxtpl import DocxTemplate
+from functools import partial
 from datetime import date
 from pathlib import Path
-from aiogram import Router, F
-from aiogram.exceptions import TelegramBadRequest
+from aiogram import Router, F, flags
+from aiogram.exceptions import TelegramAPIError, TelegramBadRequest
 from aiogram.types import Message, CallbackQuery, BufferedInputFile, InlineKeyboardButton, InlineKeyboardMarkup, \
     FSInputFile
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.fsm.context import FSMContext
 from aiogram.filters import BaseFilter
-from sqlalchemy import select, func, or_, delete
-from docx import Document
+from sqlalchemy import select, func, delete, case, insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from config import GROUP_CHAT_ID
 from db import session_scope
 from crud import upsert_problems, set_report_status, problems_stats, set_admin, set_problem_status, \
-    close_list_if_completed, upsert_staff, all_regular_approved, get_admin_ids, split_admins, upsert_review, \
-    has_any_rejection
-from keyboards.admin_kb import review_kb
+    close_list_if_completed, upsert_staff, get_admin_ids, split_admins, upsert_review, \
+    get_review_flags, get_report_with_problem, invalidate_group_topic, \
+    user_lists_cache, user_stats_cache, user_role_cache, invalidate_admin_ids, get_problems_for_acts
+from keyboards.admin_kb import review_kb, ReviewCB, list_cb, list_code_from_cb
 from models import ReportStatus, Report, ProblemStatus, Problem, ProblemList, Role, User, Staff, ActEntry, \
-    ReportDecision, ReportReview
+    ReportDecision, ReportReview, ProblemAssignee
 from utils.parsing import parse_problems_csv, parse_problems_xlsx
+from utils.telegram import fan_out, edit_with_fallback, tg_call, tg_safe
+from utils.acts import act_template_bytes, render_act
 
 from keyboards.admin_main_kb import admin_main_menu
 from keyboards.admin_manage_kb import admins_menu, cancel_kb
@@ -39,6 +44,7 @@ class AdminOnly(BaseFilter):
         return data.get("event_from_user_role") == "admin"
 
 admin_router = Router(name="admin")
+log = logging.getLogger(__name__)
 
 
 async def guard_admin(call_or_msg, event_from_user_role: str | None) -> bool:
@@ -60,27 +66,23 @@ async def build_votes_summary(session: AsyncSession, report_id: int) -> str:
       - Иван (обычный): ✅ Принял
       - Пётр (главный): ⏳ Нет голоса
     """
-    all_admin_ids = await get_admin_ids(session)
-    regular_ids, main_ids = split_admins(all_admin_ids)
-
-    if not all_admin_ids:
-        return ""
-
-    # грузим всех админов
+    # админы и их решения по отчёту — одним запросом (LEFT JOIN на голоса)
     rows = await session.execute(
-        select(User).where(User.id.in_(all_admin_ids))
+        select(User, ReportReview.decision)
+        .outerjoin(
+            ReportReview,
+            (ReportReview.admin_id == User.id)
+            & (ReportReview.report_id == report_id),
+        )
+        .where(User.role == Role.ADMIN)
+        .order_by(User.id)
     )
-    admins: list[User] = list(rows.scalars().all())
-    admin_by_id = {u.id: u for u in admins}
+    pairs = rows.all()
 
-    # грузим все решения по отчёту
-    rows2 = await session.execute(
-        select(ReportReview).where(ReportReview.report_id == report_id)
-    )
-    reviews: list[ReportReview] = list(rows2.scalars().all())
-    decision_by_admin: dict[int, ReportDecision] = {
-        r.admin_id: r.decision for r in reviews
-    }
+    if not pairs:
+        return ""
+
+    _, main_ids = split_admins(frozenset(u.id for u, _ in pairs))
 
     # имя пользователя
     def short_name(u: User) -> str:
@@ -92,13 +94,8 @@ async def build_votes_summary(session: AsyncSession, report_id: int) -> str:
 
     lines: list[str] = ["\n👥 Голоса админов:"]
 
-    for aid in all_admin_ids:
-        u = admin_by_id.get(aid)
-        if not u:
-            continue
-
-        role_label = "главный" if aid in main_ids else "обычный"
-        dec = decision_by_admin.get(aid)
+    for u, dec in pairs:
+        role_label = "главный" if u.id in main_ids else "обычный"
 
         if dec == ReportDecision.APPROVED:
             mark = "✅ Принял"
@@ -129,33 +126,6 @@ async def cb_back_main(call: CallbackQuery, state: FSMContext):
 
 
 # ===== Создание тестового акта =====
-def _docx_replace_all(doc: Document, mapping: dict[str, str]) -> None:
-    """Грубая замена {{placeholders}} по всему документу."""
-    def _replace_in_run(run, mapping):
-        text = run.text
-        changed = False
-        for k, v in mapping.items():
-            placeholder = f"{{{{{k}}}}}"   # {{title}}
-            if placeholder in text:
-                text = text.replace(placeholder, v)
-                changed = True
-        if changed:
-            run.text = text
-
-    # параграфы
-    for p in doc.paragraphs:
-        for r in p.runs:
-            _replace_in_run(r, mapping)
-
-    # таблицы
-    for tbl in doc.tables:
-        for row in tbl.rows:
-            for cell in row.cells:
-                for p in cell.paragraphs:
-                    for r in p.runs:
-                        _replace_in_run(r, mapping)
-
-
 @admin_router.callback_query(F.data == "admin:akt")
 async def cb_admin_create_akt_by_staff(
     call: CallbackQuery,
@@ -179,9 +149,16 @@ async def cb_admin_create_akt_by_staff(
 
     # папка для временных файлов
     os.makedirs("temp", exist_ok=True)
-    doc_path = "shablon/akt.docx"
 
-    total_acts = 0
+    # шаблон читаем один раз на все акты (и между запусками, пока файл не изменился)
+    try:
+        tpl_bytes = act_template_bytes()
+    except OSError as e:
+        await call.message.answer(
+            f"❌ Не удалось открыть шаблон акта: {e}",
+            reply_markup=admin_main_menu(),
+        )
+        return
 
     async with session_scope() as s:
         # 1) Берём всех сотрудников
@@ -189,37 +166,14 @@ async def cb_admin_create_akt_by_staff(
             await s.execute(select(Staff).order_by(Staff.fio))
         ).scalars().all()
 
+        # 2) Задачи без акта по первому исполнителю — одной выборкой на всех
+        todo = await get_problems_for_acts(s)
+        # (context, out_path, tg_id, caption, id задач акта)
+        jobs: list[tuple[dict, str, int, str, list[int]]] = []
+
         for staff in staff_rows:
             tg_id = staff.assignee
-
-            # --- подзапрос: есть ли уже акт по этой задаче и этому исполнителю
-            act_exists = (
-                select(ActEntry.id)
-                .where(
-                    ActEntry.problem_id == Problem.id,
-                    ActEntry.assignee == tg_id,
-                )
-                .exists()
-            )
-
-            # 2) Ищем задачи, где этот tg_id стоит ПЕРВЫМ в assignees_raw
-            #    и статус == ACCEPTED
-            #    и для них ещё нет записи в Acts
-            stmt = (
-                select(Problem, ProblemList)
-                .join(ProblemList, Problem.list_id == ProblemList.id)
-                .where(
-                    Problem.status == ProblemStatus.ACCEPTED,
-                    Problem.assignees_raw.isnot(None),
-                    or_(
-                        Problem.assignees_raw == str(tg_id),
-                        Problem.assignees_raw.like(f"{tg_id},%"),
-                    ),
-                    ~act_exists,  # <<< акт ещё не формировался
-                )
-                .order_by(ProblemList.code, Problem.number)
-            )
-            rows = (await s.execute(stmt)).all()
+            rows = todo.get(tg_id)
 
             if not rows:
                 continue  # у этого сотрудника нет новых принятых задач – пропускаем
@@ -245,50 +199,50 @@ async def cb_admin_create_akt_by_staff(
                 "fio": staff.fio,
             }
 
-            # 5) Рендерим docx по шаблону
-            try:
-                doc = DocxTemplate(doc_path)
-            except Exception as e:
-                await call.message.answer(
-                    f"❌ Не удалось открыть шаблон акта: {e}",
-                    reply_markup=admin_main_menu(),
-                )
-                return
-
-            doc.render(context)
-
-            # имя файла: akt_<fio_or_id>.docx
+            # 5) Имя файла: akt_<code>_<fio_or_id>.docx; рендер — после цикла
             safe_fio = (staff.fio or str(tg_id)).replace(" ", "_")
             filename = f"akt_{list_code}_{safe_fio}.docx"
+            if any(j[1] == os.path.join("temp", filename) for j in jobs):
+                # рендер параллельный — однофамильцы не должны писать в один файл
+                filename = f"akt_{list_code}_{safe_fio}_{tg_id}.docx"
             out_path = os.path.join("temp", filename)
 
-            doc.save(out_path)
-            total_acts += 1
+            jobs.append((
+                context, out_path, tg_id, f"Акт для {staff.fio or tg_id}",
+                [prob.id for prob, _plist in rows],
+            ))
 
-            # 6) Запоминаем, что по этим задачам и этому исполнителю акт уже сформирован
-            for prob, _plist in rows:
-                s.add(
-                    ActEntry(
-                        problem_id=prob.id,
-                        assignee=tg_id,
-                    )
-                )
+    # 6) Рендер docx (jinja + lxml) — CPU-работа: в потоках и параллельно,
+    #    event loop бота в это время продолжает обрабатывать апдейты;
+    #    соединение с БД на время рендера и отправки уже отпущено
+    await asyncio.gather(*(
+        asyncio.to_thread(render_act, tpl_bytes, context, out_path)
+        for context, out_path, *_ in jobs
+    ))
 
-            # можно коммитить пачками, но одного в конце контекста обычно достаточно.
-            # я добавлю явный коммит после цикла по staff.
-            await call.message.answer_document(
-                document=FSInputFile(out_path),
-                caption=f"Акт для {staff.fio or tg_id}",
-            )
+    total_acts = 0
+    act_rows: list[dict] = []
+
+    # 7) Все акты идут в один чат — по порядку; акт считается сформированным,
+    # только если документ действительно отправлен
+    for _context, out_path, tg_id, caption, ids in jobs:
+        try:
             await call.message.answer_document(
                 document=FSInputFile(out_path),
-                caption=f"Акт для {staff.fio or tg_id}",
+                caption=caption,
             )
+        except TelegramAPIError as e:
+            log.warning("Не удалось отправить акт %s: %s", out_path, e)
+            continue
+        total_acts += 1
+        act_rows.extend({"problem_id": pid, "assignee": tg_id} for pid in ids)
 
-        # фиксируем все ActEntry
-        await s.commit()
+    # 8) Фиксируем ActEntry одним executemany; если фиксировать нечего — в БД не идём
+    if act_rows:
+        async with session_scope() as s:
+            await s.execute(insert(ActEntry), act_rows)
 
-    # 7) Итоговое сообщение
+    # 9) Итоговое сообщение
     if total_acts == 0:
         await call.message.answer(
             "Не найдено новых задач в статусе <b>Принято</b> для формирования актов.",
@@ -420,24 +374,28 @@ async def msg_admin_staff_file(
         await msg.answer("Нужен файл в формате .xlsx.")
         return
 
-    try:
-        file = await msg.bot.get_file(msg.document.file_id)
-        raw = await msg.bot.download_file(file.file_path)
-        data = raw.read()
-    except Exception as e:
-        await msg.answer(f"❌ Не удалось скачать файл.\nОшибка: {e}")
-        await state.clear()
-        return
+    # файл качаем во временный файл, а не в BytesIO: большой xlsx не держим в куче,
+    # zip читается через page cache ОС; после разбора файл удаляется сам
+    with tempfile.TemporaryFile() as tmp:
+        try:
+            file = await msg.bot.get_file(msg.document.file_id)
+            await msg.bot.download_file(file.file_path, destination=tmp)
+        except Exception as e:
+            await msg.answer(f"❌ Не удалось скачать файл.\nОшибка: {e}")
+            await state.clear()
+            return
 
-    # парсим
-    try:
-        rows = parse_staff_xlsx(data)
-        if not rows:
-            await msg.answer("Файл прочитан, но не найдено ни одной корректной строки.")
+        # парсим
+        try:
+            # разбор XML — CPU-работа, event loop бота не блокируем
+            rows = await asyncio.to_thread(parse_staff_xlsx, tmp)
+        except Exception as e:
+            await msg.answer(f"❌ Не удалось прочитать файл.\nОшибка: {e}")
             await state.clear()
             return
-    except Exception as e:
-        await msg.answer(f"❌ Не удалось прочитать файл.\nОшибка: {e}")
+
+    if not rows:
+        await msg.answer("Файл прочитан, но не найдено ни одной корректной строки.")
         await state.clear()
         return
 
@@ -547,6 +505,7 @@ async def handle_table(msg: Message, state: FSMContext, event_from_user_role: st
                         )
                         plist_db.group_topic_id = topic.message_thread_id
                         await s.commit()
+                        invalidate_group_topic(list_code)
                     except Exception as e:
                         # не валим бота, если нет прав / группа без тем и т.п.
                         print(f"Не удалось создать тему для списка {list_code}: {e}")
@@ -710,14 +669,17 @@ async def cb_admin_stats(call: CallbackQuery, event_from_user_role: str | None =
         return
 
     # найдём все списки, в которых есть проблемы
+    # stream_scalars — коды читаются курсором, без буферизации всего результата
     async with session_scope() as s:
-        rows = await s.execute(
-            select(ProblemList.code)
-            .join(Problem, Problem.list_id == ProblemList.id)
-            .group_by(ProblemList.code)
-            .order_by(ProblemList.code)
-        )
-        codes = [r[0] for r in rows.all()]
+        codes = [
+            code
+            async for code in await s.stream_scalars(
+                select(ProblemList.code)
+                .join(Problem, Problem.list_id == ProblemList.id)
+                .group_by(ProblemList.code)
+                .order_by(ProblemList.code)
+            )
+        ]
 
     if not codes:
         await call.message.edit_text(
@@ -736,7 +698,7 @@ async def cb_admin_stats(call: CallbackQuery, event_from_user_role: str | None =
     # иначе даём выбор списка
     kb = InlineKeyboardMarkup(
         inline_keyboard=[
-            [InlineKeyboardButton(text=code, callback_data=f"admin:stats_problems_list:{code}")]
+            [InlineKeyboardButton(text=code, callback_data=list_cb("stats_problems_list", code))]
             for code in codes
         ] + [
             [InlineKeyboardButton(text="⬅️ Назад", callback_data="admin:back_main")]
@@ -754,8 +716,7 @@ async def cb_admin_stats(call: CallbackQuery, event_from_user_role: str | None =
 async def cb_admin_stats_list(call: CallbackQuery, event_from_user_role: str | None = None):
     if not await guard_admin(call, event_from_user_role):
         return
-    _, _, list_code = call.data.split(":", 3)
-    await _send_list_stats(call.message, list_code)
+    await _send_list_stats(call.message, list_code_from_cb(call.data))
     await call.answer()
 
 # ===== Управление администраторами (кнопка -> подменю) =====
@@ -784,6 +745,9 @@ async def add_admin_receive_id(msg: Message, state: FSMContext):
     target = int(msg.text)
     async with session_scope() as s:
         await set_admin(s, target, True)
+    # после commit: иначе параллельный запрос успеет закэшировать старую роль / состав админов
+    user_role_cache.invalidate(target)
+    invalidate_admin_ids()
     await msg.answer(f"✅ Пользователь {target} теперь администратор.", reply_markup=admins_menu())
     await state.clear()
 
@@ -806,137 +770,125 @@ async def del_admin_receive_id(msg: Message, state: FSMContext):
     target = int(msg.text)
     async with session_scope() as s:
         await set_admin(s, target, False)
+    # после commit: иначе параллельный запрос успеет закэшировать старую роль / состав админов
+    user_role_cache.invalidate(target)
+    invalidate_admin_ids()
     await msg.answer(f"✅ Пользователь {target} теперь пользователь.", reply_markup=admins_menu())
     await state.clear()
 
 # ===== Модерация отчётов (кнопки уже были) =====
-@admin_router.callback_query(F.data.startswith("admin:accept:"))
+@admin_router.callback_query(ReviewCB.filter(F.action == "accept"))
+@flags.db_commit
 async def cb_accept(
     call: CallbackQuery,
+    callback_data: ReviewCB,
+    session: AsyncSession,
     event_from_user_role: str | None = None,
 ):
     if not await guard_admin(call, event_from_user_role):
         return
 
-    try:
-        _, _, report_id_s, user_tg_s = call.data.split(":", 3)
-        report_id = int(report_id_s)
-        user_tg_id = int(user_tg_s)
-    except Exception:
-        await call.answer("Некорректные данные кнопки.", show_alert=True)
-        return
+    report_id = callback_data.report_id
+    user_tg_id = callback_data.user_tg_id
 
     admin_tg_id = call.from_user.id
 
-    async with session_scope() as s:
-        report = await s.get(Report, report_id)
-        if not report:
-            await call.answer("Отчёт не найден.", show_alert=True)
-            return
+    found = await get_report_with_problem(session, report_id)
+    if not found:
+        await call.answer("Отчёт не найден.", show_alert=True)
+        return
 
-        problem = await s.get(Problem, report.problem_id)
+    report, problem = found
 
-        all_admin_ids = await get_admin_ids(s)
-        regular_ids, main_ids = split_admins(all_admin_ids)
+    all_admin_ids = await get_admin_ids(session)
+    regular_ids, main_ids = split_admins(all_admin_ids)
 
-        # фиксируем, что этот админ одобрил
-        await upsert_review(s, report_id, admin_tg_id, ReportDecision.APPROVED)
+    # фиксируем, что этот админ одобрил
+    await upsert_review(session, report_id, admin_tg_id, ReportDecision.APPROVED)
 
-        # если уже кто-то отклонил — не даём принять
-        if await has_any_rejection(s, report_id):
-            await s.commit()
-            await call.answer("По этому отчёту уже есть отклонение.", show_alert=True)
-            return
+    # наличие отклонений и одобрение всеми обычными — одним запросом
+    has_rejection, regular_approved = await get_review_flags(session, report_id, regular_ids)
 
-        # === если это главный (этап 2/2) ===
-        if admin_tg_id in main_ids:
-            report.status = ReportStatus.ACCEPTED
-            if problem:
-                problem.status = ProblemStatus.ACCEPTED
-                problem.note = None
-            report.admin_id = admin_tg_id
-
-            await s.commit()
-
-            # юзеру
-            try:
-                await call.bot.send_message(
-                    chat_id=user_tg_id,
-                    text="✅ Ваш отчёт по задаче принят.",
-                )
-            except Exception:
-                pass
-
-            # собираем сводку голосов
-            votes_text = await build_votes_summary(s, report_id)
-
-            # убираем кнопки на этом сообщении и дописываем статус + голоса
-            try:
-                base = call.message.caption or call.message.text or ""
-                new_text = base + "\n\n✅ Окончательно принято." + votes_text
-                if call.message.caption is not None:
-                    await call.message.edit_caption(new_text, reply_markup=None)
-                else:
-                    await call.message.edit_text(new_text, reply_markup=None)
-            except Exception:
-                pass
-
-            await call.answer("Отчёт окончательно принят ✅")
-            return
+    # если уже кто-то отклонил — не даём принять
+    if has_rejection:
+        await session.commit()
+        await call.answer("По этому отчёту уже есть отклонение.", show_alert=True)
+        return
 
-        # === обычный админ (этап 1/2) ===
-        # если все обычные одобрили — шлём главным
-        if await all_regular_approved(s, report_id, regular_ids):
-            for mid in main_ids:
-                try:
-                    await call.bot.copy_message(
-                        chat_id=mid,
-                        from_chat_id=report.user_chat_id,
-                        message_id=report.user_msg_id,
-                        caption=(
-                            f"Новый отчёт #{report.id} (этап 2/2)\n"
-                            f"Все обычные админы его одобрили.\n\n"
-                            f"Нажмите, чтобы принять или отклонить."
-                        ),
-                        reply_markup=review_kb(report.id, user_tg_id),
-                    )
-                except Exception:
-                    pass
-
-        await s.commit()
-
-        # обновляем текст у ТЕКУЩЕГО админа (его копии) — статус + голоса
-        try:
-            votes_text = await build_votes_summary(s, report_id)
-            suffix = "\n\n✅ Ваш голос 'Принять' учтён." + votes_text
-            base = call.message.caption or call.message.text or ""
-            new_text = base + suffix
-
-            if call.message.caption is not None:
-                await call.message.edit_caption(new_text, reply_markup=None)
-            else:
-                await call.message.edit_text(new_text, reply_markup=None)
-        except Exception:
-            pass
+    # === если это главный (этап 2/2) ===
+    if admin_tg_id in main_ids:
+        report.status = ReportStatus.ACCEPTED
+        if problem:
+            problem.status = ProblemStatus.ACCEPTED
+            problem.note = None
+        report.admin_id = admin_tg_id
+
+        # собираем сводку голосов — до COMMIT, чтобы не открывать вторую транзакцию
+        votes_text = await build_votes_summary(session, report_id)
+
+        await session.commit()
+        user_lists_cache.invalidate(user_tg_id)
+        user_stats_cache.invalidate(user_tg_id)
+
+        # юзеру
+        await tg_safe(lambda: call.bot.send_message(
+            chat_id=user_tg_id,
+            text="✅ Ваш отчёт по задаче принят.",
+        ))
+
+        # убираем кнопки на этом сообщении и дописываем статус + голоса
+        base = call.message.caption or call.message.text or ""
+        await tg_safe(lambda: edit_with_fallback(call.message, base + "\n\n✅ Окончательно принято." + votes_text))
+
+        await call.answer("Отчёт окончательно принят ✅")
+        return
+
+    # === обычный админ (этап 1/2) ===
+    votes_text = await build_votes_summary(session, report_id)
+
+    # единственный COMMIT — дальше только запросы к Telegram
+    await session.commit()
+
+    # если все обычные одобрили — шлём главным
+    if regular_approved:
+        # подпись и клавиатура одинаковы для всех главных — собираем один раз
+        caption = (
+            f"Новый отчёт #{report.id} (этап 2/2)\n"
+            f"Все обычные админы его одобрили.\n\n"
+            f"Нажмите, чтобы принять или отклонить."
+        )
+        kb = review_kb(report.id, user_tg_id)
+        await fan_out(
+            partial(
+                call.bot.copy_message,
+                chat_id=mid,
+                from_chat_id=report.user_chat_id,
+                message_id=report.user_msg_id,
+                caption=caption,
+                reply_markup=kb,
+            )
+            for mid in main_ids
+        )
+
+    # обновляем текст у ТЕКУЩЕГО админа (его копии) — статус + голоса
+    suffix = "\n\n✅ Ваш голос 'Принять' учтён." + votes_text
+    base = call.message.caption or call.message.text or ""
+    await tg_safe(lambda: edit_with_fallback(call.message, base + suffix))
 
     await call.answer("Ваше одобрение учтено ✅")
 
-@admin_router.callback_query(F.data.startswith("admin:reject:"))
+@admin_router.callback_query(ReviewCB.filter(F.action == "reject"))
 async def cb_reject_start(
     call: CallbackQuery,
+    callback_data: ReviewCB,
     state: FSMContext,
     event_from_user_role: str | None = None,
 ):
     if not await guard_admin(call, event_from_user_role):
         return
 
-    try:
-        _, _, report_id_s, user_tg_s = call.data.split(":", 3)
-        report_id = int(report_id_s)
-        user_tg_id = int(user_tg_s)
-    except Exception:
-        await call.answer("Некорректные данные кнопки.", show_alert=True)
-        return
+    report_id = callback_data.report_id
+    user_tg_id = callback_data.user_tg_id
 
     # сохраняем контекст в FSM
     await state.update_data(
@@ -954,9 +906,11 @@ async def cb_reject_start(
     await call.answer()
 
 @admin_router.message(AdminStates.waiting_reject_reason)
+@flags.db_commit
 async def cb_reject_reason(
     msg: Message,
     state: FSMContext,
+    session: AsyncSession,
     event_from_user_role: str | None = None,
 ):
     if not await guard_admin(msg, event_from_user_role):
@@ -976,91 +930,89 @@ async def cb_reject_reason(
 
     admin_tg_id = msg.from_user.id
 
-    async with session_scope() as s:
-        report = await s.get(Report, report_id)
-        if not report:
-            await msg.answer("Отчёт не найден.", reply_markup=admin_main_menu())
-            await state.clear()
-            return
+    found = await get_report_with_problem(session, report_id)
+    if not found:
+        await msg.answer("Отчёт не найден.", reply_markup=admin_main_menu())
+        await state.clear()
+        return
 
-        problem = await s.get(Problem, report.problem_id)
+    report, problem = found
 
-        # фиксируем REJECT
-        await upsert_review(s, report_id, admin_tg_id, ReportDecision.REJECTED)
+    # фиксируем REJECT
+    await upsert_review(session, report_id, admin_tg_id, ReportDecision.REJECTED)
 
-        # отчёт и задача сразу в REJECTED
-        report.status = ReportStatus.REJECTED
-        report.admin_id = admin_tg_id
-        report.admin_reason = reason
+    # отчёт и задача сразу в REJECTED
+    report.status = ReportStatus.REJECTED
+    report.admin_id = admin_tg_id
+    report.admin_reason = reason
 
-        if problem:
-            problem.status = ProblemStatus.REJECTED
-            problem.note = reason
+    if problem:
+        problem.status = ProblemStatus.REJECTED
+        problem.note = reason
 
-        await s.commit()
+    # сводку голосов читаем в той же транзакции (голос уже сброшен в upsert_review),
+    # чтобы после COMMIT не держать транзакцию открытой на время запросов к Telegram
+    votes_text = await build_votes_summary(session, report_id)
 
-        # уведомляем исполнителя
-        try:
-            text = (
-                "❌ Ваш отчёт отклонён. Задача отправлена на доработку.\n"
-                f"Причина: {reason}"
-            )
-            await msg.bot.send_message(
-                chat_id=user_tg_id,
-                text=text,
-            )
-        except Exception:
-            pass
+    await session.commit()
+    user_lists_cache.invalidate(user_tg_id)
+    user_stats_cache.invalidate(user_tg_id)
 
-        # для красоты — получим сводку голосов
-        votes_text = await build_votes_summary(s, report_id)
+    # уведомляем исполнителя
+    text = (
+        "❌ Ваш отчёт отклонён. Задача отправлена на доработку.\n"
+        f"Причина: {reason}"
+    )
+    await tg_safe(lambda: msg.bot.send_message(
+        chat_id=user_tg_id,
+        text=text,
+    ))
 
     # обновляем подпись/текст у исходного сообщения с отчётом (у этого админа)
-    try:
-        if msg_chat_id and msg_id:
-            # подтягиваем сообщение через bot.edit...
-            from aiogram.exceptions import TelegramBadRequest
-
-            try:
-                await msg.bot.edit_message_caption(
-                    chat_id=msg_chat_id,
-                    message_id=msg_id,
-                    caption=(
-                        f"Отчёт #{report_id}\n\n"
-                        f"❌ Отклонён. Задача на доработку.\n"
-                        f"Причина: {reason}"
-                        f"{votes_text}"
-                    ),
-                    reply_markup=None,
-                )
-            except TelegramBadRequest:
-                # если не было подписи — пробуем текстом
-                await msg.bot.edit_message_text(
-                    chat_id=msg_chat_id,
-                    message_id=msg_id,
-                    text=(
-                        f"Отчёт #{report_id}\n\n"
-                        f"❌ Отклонён. Задача на доработку.\n"
-                        f"Причина: {reason}"
-                        f"{votes_text}"
-                    ),
-                    reply_markup=None,
-                )
-    except Exception:
-        pass
+    if msg_chat_id and msg_id:
+        new_text = (
+            f"Отчёт #{report_id}\n\n"
+            f"❌ Отклонён. Задача на доработку.\n"
+            f"Причина: {reason}"
+            f"{votes_text}"
+        )
+        try:
+            await tg_call(lambda: msg.bot.edit_message_caption(
+                chat_id=msg_chat_id,
+                message_id=msg_id,
+                caption=new_text,
+                reply_markup=None,
+            ))
+        except TelegramBadRequest:
+            # если не было подписи — пробуем текстом
+            await tg_safe(lambda: msg.bot.edit_message_text(
+                chat_id=msg_chat_id,
+                message_id=msg_id,
+                text=new_text,
+                reply_markup=None,
+            ))
+        except TelegramAPIError as e:
+            log.warning("Не удалось обновить сообщение с отчётом #%s: %s", report_id, e)
 
     await msg.answer("❌ Отчёт отклонён. Причина сохранена.", reply_markup=admin_main_menu())
     await state.clear()
 
 
+USERS_LIST_LIMIT = 200
+
+
 @admin_router.callback_query(F.data == "admin:users")
-async def cb_admin_users(call: CallbackQuery, event_from_user_role: str | None = None):
+async def cb_admin_users(call: CallbackQuery, session: AsyncSession, event_from_user_role: str | None = None):
     if not await guard_admin(call, event_from_user_role):
         return
 
-    async with session_scope() as s:
-        res = await s.execute(select(User).order_by(User.role, User.id))
-        users = res.scalars().all()
+    # админы первыми; больше USERS_LIST_LIMIT строк в одно сообщение всё равно не влезет
+    res = await session.execute(
+        select(User)
+        .order_by(case((User.role == Role.ADMIN, 0), else_=1), User.id)
+        .limit(USERS_LIST_LIMIT)
+    )
+    users = res.scalars().all()
 
     if not users:
         # тут тоже безопаснее отвечать новым сообщением
@@ -1071,38 +1023,36 @@ async def cb_admin_users(call: CallbackQuery, event_from_user_role: str | None =
         await call.answer()
         return
 
-    admins = [u for u in users if u.role == Role.ADMIN]
-    regular = [u for u in users if u.role == Role.USER]
-
-    def fmt_user(u: User) -> str:
-        name = " ".join(filter(None, [u.first_name, u.last_name])).strip()
-        if not name:
-            name = u.username or ""
-        return f"{u.id} - {name or 'без имени'} - {u.role.value}"
+    # один проход: строки текста по ролям + первые 50 кнопок для "копирования" ID
+    admin_lines: list[str] = []
+    user_lines: list[str] = []
+    kb_rows: list[list[InlineKeyboardButton]] = []
+    for i, u in enumerate(users):
+        name = " ".join(filter(None, [u.first_name, u.last_name])).strip() or u.username or ""
+        (admin_lines if u.role == Role.ADMIN else user_lines).append(
+            f"• {u.id} - {name or 'без имени'} - {u.role.value}"
+        )
+        if i < 50:
+            kb_rows.append([
+                InlineKeyboardButton(
+                    text=f"{u.first_name or u.username or 'user'} ({u.id})",
+                    callback_data=f"admin:userid:{u.id}",
+                )
+            ])
 
     lines: list[str] = []
 
-    if admins:
+    if admin_lines:
         lines.append("<b>Администраторы:</b>")
-        lines += [f"• {fmt_user(u)}" for u in admins]
+        lines += admin_lines
         lines.append("")
 
-    if regular:
+    if user_lines:
         lines.append("<b>Пользователи:</b>")
-        lines += [f"• {fmt_user(u)}" for u in regular]
+        lines += user_lines
 
     text = "\n".join(lines)
 
-    # Кнопки для "копирования" ID
-    kb_rows = []
-    for u in users[:50]:
-        label_name = u.first_name or u.username or "user"
-        kb_rows.append([
-            InlineKeyboardButton(
-                text=f"{label_name} ({u.id})",
-                callback_data=f"admin:userid:{u.id}",
-            )
-        ])
     kb_rows.append([InlineKeyboardButton(text="⬅️ Назад", callback_data="admin:back_main")])
     kb = InlineKeyboardMarkup(inline_keyboard=kb_rows)
 
@@ -1122,26 +1072,26 @@ async def cb_admin_users(call: CallbackQuery, event_from_user_role: str | None =
 @admin_router.callback_query(F.data == "admin:delete_plists")
 async def cb_admin_delete_plists(
     call: CallbackQuery,
+    session: AsyncSession,
     event_from_user_role: str | None = None,
 ):
     """Показать список всех списков проблем для выбора удаления."""
     if not await guard_admin(call, event_from_user_role):
         return
 
-    async with session_scope() as s:
-        rows = await s.execute(
-            select(
-                ProblemList.id,
-                ProblemList.code,
-                ProblemList.title,
-                ProblemList.is_closed,
-                func.count(Problem.id).label("cnt"),
-            )
-            .join(Problem, Problem.list_id == ProblemList.id, isouter=True)
-            .group_by(ProblemList.id, ProblemList.code, ProblemList.title, ProblemList.is_closed)
-            .order_by(ProblemList.code)
+    # подпись статуса и заглушку для пустого названия считает БД
+    rows = await session.execute(
+        select(
+            ProblemList.code,
+            func.coalesce(func.nullif(ProblemList.title, ""), "(без названия)").label("title_display"),
+            case((ProblemList.is_closed, "✅ закрыт"), else_="🟢 открыт").label("status"),
+            func.count(Problem.id).label("cnt"),
         )
-        items = rows.all()
+        .join(Problem, Problem.list_id == ProblemList.id, isouter=True)
+        .group_by(ProblemList.id, ProblemList.code, ProblemList.title, ProblemList.is_closed)
+        .order_by(ProblemList.code)
+    )
+    items = rows.all()
 
     if not items:
         await call.message.edit_text(
@@ -1152,14 +1102,12 @@ async def cb_admin_delete_plists(
         return
 
     kb_rows: list[list[InlineKeyboardButton]] = []
-    for pid, code, title, is_closed, cnt in items:
-        title_display = title or "(без названия)"
-        status = "✅ закрыт" if is_closed else "🟢 открыт"
+    for code, title_display, status, cnt in items:
         text = f"{code} — {title_display} ({cnt} задач, {status})"
         kb_rows.append([
             InlineKeyboardButton(
                 text=text,
-                callback_data=f"admin:del_plist:{code}",
+                callback_data=list_cb("del_plist", code),
             )
         ])
 
@@ -1189,11 +1137,7 @@ async def cb_admin_del_plist_confirm(
     if not await guard_admin(call, event_from_user_role):
         return
 
-    try:
-        _, _, list_code = call.data.split(":", 2)
-    except Exception:
-        await call.answer("Некорректные данные кнопки.", show_alert=True)
-        return
+    list_code = list_code_from_cb(call.data)
 
     async with session_scope() as s:
         row = await s.execute(
@@ -1233,7 +1177,7 @@ async def cb_admin_del_plist_confirm(
         [
             InlineKeyboardButton(
                 text="✅ Да, удалить",
-                callback_data=f"admin:del_plist_do:{plist.code}",
+                callback_data=list_cb("del_plist_do", plist.code),
             )
         ],
         [
@@ -1248,55 +1192,61 @@ async def cb_admin_del_plist_confirm(
     await call.answer()
 
 @admin_router.callback_query(F.data.startswith("admin:del_plist_do:"))
+@flags.db_commit
 async def cb_admin_del_plist_do(
     call: CallbackQuery,
+    session: AsyncSession,
     event_from_user_role: str | None = None,
 ):
     """Удаляет список проблем и все его задачи (без ленивых загрузок)."""
     if not await guard_admin(call, event_from_user_role):
         return
 
-    try:
-        _, _, list_code = call.data.split(":", 2)
-    except Exception:
-        await call.answer("Некорректные данные кнопки.", show_alert=True)
-        return
-
-    async with session_scope() as s:
-        # 1) найдём список
-        row = await s.execute(
-            select(ProblemList.id, ProblemList.code, ProblemList.title)
-            .where(ProblemList.code == list_code)
-        )
-        plist_row = row.first()
+    list_code = list_code_from_cb(call.data)
 
-        if not plist_row:
-            await call.message.edit_text(
-                f"Список с кодом <b>{list_code}</b> уже не существует.",
-                reply_markup=admin_main_menu(),
-            )
-            await call.answer()
-            return
-
-        plist_id, code, title = plist_row
-        title = title or "(без названия)"
+    # 1) удаляем задачи списка (id списка — подзапросом по коду),
+    #    количество удалённых берём из rowcount — без отдельного COUNT
+    plist_id_q = (
+        select(ProblemList.id)
+        .where(ProblemList.code == list_code)
+        .scalar_subquery()
+    )
+    # исполнители задач удаляются явно: в SQLite ON DELETE CASCADE по умолчанию выключен
+    await session.execute(
+        delete(ProblemAssignee)
+        .where(ProblemAssignee.problem_id.in_(select(Problem.id).where(Problem.list_id == plist_id_q)))
+        .execution_options(synchronize_session=False)
+    )
+    res_probs = await session.execute(
+        delete(Problem)
+        .where(Problem.list_id == plist_id_q)
+        .execution_options(synchronize_session=False)
+    )
+    problems_count = res_probs.rowcount or 0
+
+    # 2) удаляем сам список и сразу получаем его данные
+    res_plist = await session.execute(
+        delete(ProblemList)
+        .where(ProblemList.code == list_code)
+        .returning(ProblemList.code, ProblemList.title)
+        .execution_options(synchronize_session=False)
+    )
+    plist_row = res_plist.first()
 
-        # 2) посчитаем количество задач в этом списке
-        q_cnt = await s.execute(
-            select(func.count(Problem.id)).where(Problem.list_id == plist_id)
+    if not plist_row:
+        await call.message.edit_text(
+            f"Список с кодом <b>{list_code}</b> уже не существует.",
+            reply_markup=admin_main_menu(),
         )
-        problems_count = q_cnt.scalar_one() or 0
+        await call.answer()
+        return
 
-        # 3) сначала удаляем задачи этого списка
-        await s.execute(
-            delete(Problem).where(Problem.list_id == plist_id)
-        )
-        # 4) затем удаляем сам список
-        await s.execute(
-            delete(ProblemList).where(ProblemList.id == plist_id)
-        )
+    code, title = plist_row
+    title = title or "(без названия)"
 
-        await s.commit()
+    await session.commit()
+    # после commit: иначе параллельный отчёт успеет закэшировать тему удаляемого списка
+    invalidate_group_topic(list_code)
 
     text = (
         f"🗑 Список проблем <b>{code}</b> ({title}) удалён.\n"
@@ -1304,7 +1254,7 @@ async def cb_admin_del_plist_do(
     )
 
     try:
-        await call.message.edit_text(text, reply_markup=admin_main_menu())
+        await tg_call(lambda: call.message.edit_text(text, reply_markup=admin_main_menu()))
     except TelegramBadRequest as e:
         if "message is not modified" not in str(e):
             raise
@@ -1,6 +1,6 @@
 # handlers/common.py
 from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery
+from aiogram.types import Message
 
 from keyboards.admin_main_kb import admin_main_menu
 from texts import START
@@ -19,7 +19,3 @@ async def start_all(msg: Message, event_from_user_role: str | None = None):
         )
     else:
         await msg.answer(START, reply_markup=main_menu())
-
-# @common_router.callback_query()
-# async def _dbg_any_cb_global(call: CallbackQuery, event_from_user_role: str | None = None):
-#     await call.answer(f"GLOBAL cb: {call.data} (role={event_from_user_role})", show_alert=True)
\ No newline at end of file
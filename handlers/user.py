@@ -1,8 +1,9 @@
 # handlers/user.py
 from __future__ import annotations
 
-from io import BytesIO
+import asyncio
 import html
+from functools import lru_cache, partial
 
 from aiogram import Router, F
 from aiogram.exceptions import TelegramBadRequest
@@ -10,10 +11,12 @@ from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKe
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.fsm.context import FSMContext
 
-from sqlalchemy import select, func, literal
+from sqlalchemy import select, exists, or_, bindparam
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import contains_eager
 
 from config import GROUP_CHAT_ID
-from keyboards.user_kb import main_menu
+from keyboards.user_kb import main_menu, UserCB
 from keyboards.admin_kb import review_kb
 from texts import (
     START, ASK_DATA, REPORT_SENT, USER_STATS,
@@ -26,50 +29,38 @@ from crud import (
     user_stats,
     MediaType,
     set_problem_status,
+    get_group_topic_id,
+    get_admin_ids,
+    split_admins,
+    user_lists_cache,
+    user_stats_cache,
 )
 from models import (
     Problem,
     ProblemList,
     ProblemStatus,
-    User as MUser,
-    Role,
+    ProblemAssignee,
 )
-from utils.files import ensure_dirs, build_paths, save_bytes_to_all
-
-
-# ===== Гард роли =====
-async def guard_user(event, event_from_user_role: str | None) -> bool:
-    if event_from_user_role != "user":
-        text = "Эта функция доступна только пользователям."
-        # CallbackQuery vs Message
-        if hasattr(event, "answer") and event.__class__.__name__ == "CallbackQuery":
-            await event.answer(text, show_alert=True)
-        else:
-            await event.answer(text)
-        return False
-    return True
-
-async def _get_group_topic_for_list(list_code: str) -> int | None:
+from utils.files import ensure_dirs, build_user_path
+from utils.telegram import edit_with_fallback, fan_out
+from middlewares.user_only_mw import UserOnlyMiddleware
+
+
+async def _get_group_topic_for_list(session: AsyncSession, list_code: str) -> int | None:
     """
     Возвращает message_thread_id темы в группе для списка list_code.
-    Ничего не создаёт, просто читает ProblemList.group_topic_id.
+    Ничего не создаёт, просто читает ProblemList.group_topic_id (через TTL-кэш).
     """
     if not GROUP_CHAT_ID:
         return None
 
-    async with session_scope() as s:
-        row = await s.execute(
-            select(ProblemList.group_topic_id).where(ProblemList.code == list_code)
-        )
-        topic_id = row.scalar_one_or_none()
-
-    if not topic_id:
-        return None
-
-    return int(topic_id)
+    return await get_group_topic_id(session, list_code)
 
 
 user_router = Router(name="user")
+# проверка роли "user" один раз для всех хендлеров роутера
+user_router.message.middleware(UserOnlyMiddleware())
+user_router.callback_query.middleware(UserOnlyMiddleware())
 
 
 # ===== Состояния =====
@@ -78,61 +69,63 @@ class ReportStates(StatesGroup):
 
 
 # ===== Лейблы статусов =====
-STATUS_LABELS = {
-    ProblemStatus.IN_PROGRESS: "В работе",
-    ProblemStatus.REPORT_SENT: "Отчёт отправлен",
-    ProblemStatus.ACCEPTED: "Отчёт принят",
-    ProblemStatus.REJECTED: "Отчёт отклонён",
+# метки статусов в списке задач (с иконками)
+STATUS_ICON_LABELS = {
+    ProblemStatus.IN_PROGRESS: "🟡 В работе",
+    ProblemStatus.REPORT_SENT: "🔵 Отчёт отправлен",
+    ProblemStatus.ACCEPTED:    "✅ Принят",
+    ProblemStatus.REJECTED:    "❌ Отклонён",
+}
+
+
+# для карточки задачи: статус приходит строкой (Problem.status.value)
+STATUS_CARD_LABELS = {
+    "in_progress": "🟡 В работе",
+    "report_sent": "🟠 Отчёт отправлен",
+    "accepted": "🟢 Отчёт принят",
+    "rejected": "🔴 Отчёт отклонён",
 }
 
 
+def _h(text: str | None) -> str:
+    """Экранирует пользовательский текст для parse_mode=HTML."""
+    return html.escape(text or "", quote=False)
+
+
+def _short_title(title: str | None) -> str:
+    """Название для кнопки: не длиннее 40 символов."""
+    title = title or ""
+    return title if len(title) <= 40 else title[:37] + "..."
+
+
 # ===== Локальные клавиатуры =====
 
-def lists_menu(codes: list[str]) -> InlineKeyboardMarkup:
+@lru_cache(maxsize=256)
+def lists_menu(codes: tuple[str, ...]) -> InlineKeyboardMarkup:
     """Список списков проблем."""
     kb = [
-        [InlineKeyboardButton(text=code, callback_data=f"user:plist_view:{code}")]
+        [InlineKeyboardButton(text=code, callback_data=UserCB(action="plist_view", list_code=code).pack())]
         for code in codes
     ]
     kb.append([InlineKeyboardButton(text="⬅️ Назад", callback_data="user:back_main")])
     return InlineKeyboardMarkup(inline_keyboard=kb)
 
 
-def problems_menu(list_code: str, problems: list[dict]) -> InlineKeyboardMarkup:
-    """Список проблем в выбранном списке."""
-    rows: list[list[InlineKeyboardButton]] = []
-    for p in problems:
-        num = p["number"]
-        title = p["title"] or ""
-        short = title if len(title) <= 40 else title[:37] + "..."
-        rows.append([
-            InlineKeyboardButton(
-                text=f"#{num} — {short}",
-                callback_data=f"user:problem:{list_code}:{num}",
-            )
-        ])
-    rows.append([
-        InlineKeyboardButton(
-            text="⬅️ Назад к спискам",
-            callback_data="user:back_lists",
-        )
-    ])
-    return InlineKeyboardMarkup(inline_keyboard=rows)
-
-
+# ключ — конкретная задача, их больше, чем наборов списков у пользователей
+@lru_cache(maxsize=512)
 def problem_detail_menu(list_code: str, number: int) -> InlineKeyboardMarkup:
     """Карточка проблемы: загрузить отчёт / назад."""
     return InlineKeyboardMarkup(inline_keyboard=[
         [
             InlineKeyboardButton(
                 text="📤 Загрузить отчёт",
-                callback_data=f"user:upload_for:{list_code}:{number}",
+                callback_data=UserCB(action="upload_for", list_code=list_code, number=number).pack(),
             )
         ],
         [
             InlineKeyboardButton(
                 text="⬅️ Назад к списку проблем",
-                callback_data=f"user:back_problems:{list_code}",
+                callback_data=UserCB(action="back_problems", list_code=list_code).pack(),
             )
         ],
     ])
@@ -140,68 +133,99 @@ def problem_detail_menu(list_code: str, number: int) -> InlineKeyboardMarkup:
 
 # ===== Вспомогательные функции =====
 
+# больше кнопок в меню списков всё равно не поместится
+USER_LISTS_LIMIT = 50
+
+
+# ===== Заранее собранные запросы (значения — через bindparam) =====
+
+# исполнители не указаны или среди них есть tg_id — по problem_assignees,
+# как и остальные запросы пользователя (уникальный индекс problem_id + user_tg_id)
+_ASSIGNEE_ALLOWED = or_(
+    ~exists().where(ProblemAssignee.problem_id == Problem.id),
+    exists().where(
+        ProblemAssignee.problem_id == Problem.id,
+        ProblemAssignee.user_tg_id == bindparam("tg_id"),
+    ),
+)
+
+_STMT_USER_LISTS = (
+    select(ProblemList.code)
+    .join(Problem, Problem.list_id == ProblemList.id)
+    .join(ProblemAssignee, ProblemAssignee.problem_id == Problem.id)
+    .where(
+        ProblemAssignee.user_tg_id == bindparam("tg_id"),
+        ProblemList.is_closed.is_(False),
+        Problem.status.in_([
+            ProblemStatus.IN_PROGRESS,
+            ProblemStatus.REPORT_SENT,
+            ProblemStatus.REJECTED,
+        ]),
+    )
+    .distinct()
+    .order_by(ProblemList.code)
+    .limit(USER_LISTS_LIMIT)
+)
+
+# третья колонка — "пользователь среди исполнителей или исполнители не указаны"
+_STMT_PROBLEM_DETAIL = (
+    select(
+        Problem,
+        ProblemList.is_closed,
+        _ASSIGNEE_ALLOWED,
+    )
+    .join(ProblemList, Problem.list_id == ProblemList.id)
+    # plist заполняется из того же JOIN — обращение к problem.plist не ходит в БД
+    .options(contains_eager(Problem.plist))
+    .where(
+        ProblemList.code == bindparam("code"),
+        Problem.number == bindparam("number"),
+    )
+)
+
 async def _load_user_lists(user_tg_id: int) -> list[str]:
     """
     Открытые списки, в которых у пользователя есть задачи
     в статусах: IN_PROGRESS / REPORT_SENT / REJECTED.
     """
-    async with session_scope() as s:
-        # колонка из БД (NOT property!)
-        ass_col = Problem.assignees_raw    # mapped_column("assignees", Text, ...)
-
-        # делаем ',<строка>,', чтобы искать целый ID
-        # COALESCE нужен, если assignees_raw = NULL
-        full = literal(",") + func.coalesce(ass_col, "") + literal(",")
-        pattern = f"%,{user_tg_id},%"
+    async def load() -> list[str]:
+        async with session_scope() as s:
+            rows = await s.execute(_STMT_USER_LISTS, {"tg_id": user_tg_id})
+            return list(rows.scalars().all())
 
-        stmt = (
-            select(ProblemList.code)
-            .join(Problem, Problem.list_id == ProblemList.id)
-            .where(
-                ProblemList.is_closed.is_(False),
-                Problem.status.in_([
-                    ProblemStatus.IN_PROGRESS,
-                    ProblemStatus.REPORT_SENT,
-                    ProblemStatus.REJECTED,
-                ]),
-                full.like(pattern),
-            )
-            .distinct()
-            .order_by(ProblemList.code)
-        )
-        rows = await s.execute(stmt)
-        return list(rows.scalars().all())
+    # повторные нажатия "назад к спискам" в течение USER_LISTS_TTL не ходят в БД
+    return await user_lists_cache.get_or_load(user_tg_id, load)
 
 
-async def _load_problems_for_user(list_code: str, user_tg_id: int) -> list[dict]:
+async def _load_lists_and_problems(user_tg_id: int) -> dict[str, list[Problem]]:
     """
-    Возвращает активные проблемы (без принятых) в указанном списке для данного пользователя.
+    Задачи пользователя во всех открытых списках одним запросом:
+    code -> задачи по возрастанию номера.
+    Как и в _load_user_lists, остаются только списки, где есть задачи
+    в статусах IN_PROGRESS / REPORT_SENT / REJECTED.
     """
     async with session_scope() as s:
         rows = await s.execute(
-            select(
-                Problem.number,
-                Problem.title,
-                Problem.status,
-            )
-            .join(ProblemList)
+            select(ProblemList.code, Problem)
+            .join(ProblemList, Problem.list_id == ProblemList.id)
+            .join(ProblemAssignee, ProblemAssignee.problem_id == Problem.id)
             .where(
-                ProblemList.code == list_code,
-                Problem.assignees_raw == user_tg_id,
-                Problem.status.in_([
-                    ProblemStatus.IN_PROGRESS,
-                    ProblemStatus.REPORT_SENT,
-                    ProblemStatus.REJECTED,
-                ]),
+                ProblemAssignee.user_tg_id == user_tg_id,
+                ProblemList.is_closed.is_(False),
             )
-            .order_by(Problem.number)
-        )
-    problems = []
-    for num, title, status in rows.all():
-        problems.append(
-            {"number": num, "title": title, "status": status}
+            .order_by(ProblemList.code, Problem.number)
         )
-    return problems
+        pairs = rows.all()
+
+    active = {ProblemStatus.IN_PROGRESS, ProblemStatus.REPORT_SENT, ProblemStatus.REJECTED}
+    by_code: dict[str, list[Problem]] = {}
+    active_codes: set[str] = set()
+    for code, p in pairs:
+        by_code.setdefault(code, []).append(p)
+        if p.status in active:
+            active_codes.add(code)
+
+    return {code: probs for code, probs in by_code.items() if code in active_codes}
 
 
 async def _show_problems_in_list(
@@ -215,25 +239,34 @@ async def _show_problems_in_list(
     page – номер страницы (0-based).
     """
     async with session_scope() as s:
-        ass_col = Problem.assignees_raw
-        full = literal(",") + func.coalesce(ass_col, "") + literal(",")
-        pattern = f"%,{user_tg_id},%"
-
         rows = await s.execute(
-            select(Problem, ProblemList)
+            select(Problem)
             .join(ProblemList, Problem.list_id == ProblemList.id)
+            .join(ProblemAssignee, ProblemAssignee.problem_id == Problem.id)
+            # JOIN со списком уже есть — им же заполняем p.plist, без ленивых догрузок
+            .options(contains_eager(Problem.plist))
             .where(
+                ProblemAssignee.user_tg_id == user_tg_id,
                 ProblemList.code == list_code,
                 ProblemList.is_closed.is_(False),
-                full.like(pattern),
             )
             .order_by(Problem.number)
         )
 
-        pairs = rows.all()
+        problems = list(rows.scalars().all())
+
+    await _render_problems_page(msg, list_code, problems, page)
+
 
-    if not pairs:
-        text = f"В списке <b>{list_code}</b> нет задач, назначенных на вас."
+async def _render_problems_page(
+    msg: Message,
+    list_code: str,
+    problems: list[Problem],
+    page: int = 0,
+) -> None:
+    """Отрисовывает страницу уже загруженных задач списка."""
+    if not problems:
+        text = f"В списке <b>{_h(list_code)}</b> нет задач, назначенных на вас."
         try:
             await msg.edit_text(text)
         except TelegramBadRequest as e:
@@ -243,7 +276,7 @@ async def _show_problems_in_list(
 
     # ---- ПАГИНАЦИЯ ----
     page_size = 10
-    total = len(pairs)
+    total = len(problems)
     max_page = (total - 1) // page_size  # минимум 0
 
     if page < 0:
@@ -253,71 +286,54 @@ async def _show_problems_in_list(
 
     start = page * page_size
     end = min(start + page_size, total)
-    current_pairs = pairs[start:end]
+    current = problems[start:end]
 
-    status_map = {
-        ProblemStatus.IN_PROGRESS: "🟡 В работе",
-        ProblemStatus.REPORT_SENT: "🔵 Отчёт отправлен",
-        ProblemStatus.ACCEPTED:    "✅ Принят",
-        ProblemStatus.REJECTED:    "❌ Отклонён",
-    }
-
-    lines: list[str] = [f"<b>Список: {list_code}</b>", ""]
-    problems_for_kb: list[dict] = []
+    lines: list[str] = [f"<b>Список: {_h(list_code)}</b>", ""]
+    # кнопки задач (только текущая страница) собираем в том же проходе
+    kb_rows: list[list[InlineKeyboardButton]] = []
 
-    for p, plist in current_pairs:
-        status_label = status_map.get(p.status, p.status.value)
-        line = f"№{p.number}: {p.title}\n    {status_label}"
+    for p in current:
+        status_label = STATUS_ICON_LABELS.get(p.status, p.status.value)
+        line = f"№{p.number}: {_h(p.title)}\n    {status_label}"
         if p.note:
-            line += f"\n    Примечание: {p.note}"
+            line += f"\n    Примечание: {_h(p.note)}"
         lines.append(line)
         lines.append("")
 
-        problems_for_kb.append(
-            {
-                "id": p.id,
-                "number": p.number,
-                "title": p.title,
-                "status": p.status.value,
-            }
-        )
+        kb_rows.append([
+            InlineKeyboardButton(
+                text=f"#{p.number} — {_short_title(p.title)}",
+                callback_data=UserCB(action="problem", list_code=list_code, number=p.number).pack(),
+            )
+        ])
 
     lines.append(
         f"Показаны задачи {start + 1}–{end} из {total} (стр. {page + 1}/{max_page + 1})."
     )
     text = "\n".join(lines).rstrip()
     if len(text) > 4000:
-        text = text[:4000] + "\n\n(текст обрезан)"
-
-    # ---- КЛАВИАТУРА С КНОПКАМИ ЗАДАЧ И ПАГИНАЦИЕЙ ----
-    kb_rows: list[list[InlineKeyboardButton]] = []
-
-    # Кнопки задач (только текущая страница)
-    for p in problems_for_kb:
-        num = p["number"]
-        title = p["title"] or ""
-        short = title if len(title) <= 40 else title[:37] + "..."
-        kb_rows.append([
-            InlineKeyboardButton(
-                text=f"#{num} — {short}",
-                callback_data=f"user:problem:{list_code}:{num}",
-            )
-        ])
-
+        text = text[:4000]
+        # не оставляем обрезанную HTML-сущность вроде "&am"
+        amp = text.rfind("&")
+        if amp > text.rfind(";"):
+            text = text[:amp]
+        text += "\n\n(текст обрезан)"
+
+    # ---- ПАГИНАЦИЯ В КЛАВИАТУРЕ ----
     # Навигация страницами
     nav_row: list[InlineKeyboardButton] = []
     if page > 0:
         nav_row.append(
             InlineKeyboardButton(
                 text="◀️ Назад",
-                callback_data=f"user:plist_page:{list_code}:{page - 1}",
+                callback_data=UserCB(action="plist_page", list_code=list_code, number=page - 1).pack(),
             )
         )
     if page < max_page:
         nav_row.append(
             InlineKeyboardButton(
                 text="Вперёд ▶️",
-                callback_data=f"user:plist_page:{list_code}:{page + 1}",
+                callback_data=UserCB(action="plist_page", list_code=list_code, number=page + 1).pack(),
             )
         )
     if nav_row:
@@ -341,41 +357,54 @@ async def _show_problems_in_list(
         raise
 
 
-async def _load_problem_detail(list_code: str, number: int) -> dict | None:
+async def _load_problem_detail(
+    list_code: str,
+    number: int,
+    for_assignee: int | None = None,
+    require_open: bool = False,
+) -> dict:
+    """
+    Карточка проблемы одним запросом.
+
+    Проверки исполнителя (for_assignee) и закрытости списка (require_open)
+    считаются в том же SELECT; результат — в ключе "state":
+    "not_found" | "wrong_assignee" | "closed" | "ok".
+    """
     async with session_scope() as s:
         row = await s.execute(
-            select(Problem, ProblemList)
-            .join(ProblemList, Problem.list_id == ProblemList.id)
-            .where(
-                ProblemList.code == list_code,
-                Problem.number == number,
-            )
+            _STMT_PROBLEM_DETAIL,
+            {"code": list_code, "number": number, "tg_id": for_assignee},
         )
         res = row.first()
 
     if not res:
-        return None
+        return {"state": "not_found"}
+
+    problem, is_closed, is_allowed = res
 
-    problem, plist = res
+    if require_open and is_closed:
+        state = "closed"
+    elif for_assignee is not None and not is_allowed:
+        state = "wrong_assignee"
+    else:
+        state = "ok"
 
     return {
+        "state": state,
         "id": problem.id,
         "number": problem.number,
         "title": problem.title,
-        "assignees": problem.assignees,   # ← property -> list[int]
         "due_date": problem.due_date,
         "status": problem.status.value,
         "note": problem.note,
-        "is_closed": plist.is_closed,
+        "is_closed": is_closed,
     }
 
 
 # ===== /start =====
 
 @user_router.message(F.text == "/start")
-async def cmd_start(msg: Message, state: FSMContext, event_from_user_role: str | None = None):
-    if not await guard_user(msg, event_from_user_role):
-        return
+async def cmd_start(msg: Message, state: FSMContext):
     await state.clear()
     ensure_dirs()
     async with session_scope() as s:
@@ -392,12 +421,11 @@ async def cmd_start(msg: Message, state: FSMContext, event_from_user_role: str |
 # ===== Главное меню: список проблем =====
 
 @user_router.callback_query(F.data == "user:problems")
-async def cb_problems_root(call: CallbackQuery, state: FSMContext, event_from_user_role: str | None = None):
-    if not await guard_user(call, event_from_user_role):
-        return
+async def cb_problems_root(call: CallbackQuery, state: FSMContext):
     await state.clear()
 
-    codes = await _load_user_lists(call.from_user.id)
+    by_code = await _load_lists_and_problems(call.from_user.id)
+    codes = list(by_code)
 
     if not codes:
         await call.message.edit_text(
@@ -408,29 +436,25 @@ async def cb_problems_root(call: CallbackQuery, state: FSMContext, event_from_us
         return
 
     if len(codes) == 1:
-        # сразу показываем проблемы этого списка
-        await _show_problems_in_list(call.message, codes[0], call.from_user.id)
+        # сразу показываем проблемы этого списка — они уже загружены
+        await _render_problems_page(call.message, codes[0], by_code[codes[0]])
     else:
         await call.message.edit_text(
             "Выберите список проблем:",
-            reply_markup=lists_menu(codes),
+            reply_markup=lists_menu(tuple(codes)),
         )
 
     await call.answer()
 
 
 @user_router.callback_query(F.data == "user:back_main")
-async def cb_back_main(call: CallbackQuery, event_from_user_role: str | None = None):
-    if not await guard_user(call, event_from_user_role):
-        return
+async def cb_back_main(call: CallbackQuery):
     await call.message.edit_text(START, reply_markup=main_menu())
     await call.answer()
 
 
 @user_router.callback_query(F.data == "user:back_lists")
-async def cb_back_lists(call: CallbackQuery, event_from_user_role: str | None = None):
-    if not await guard_user(call, event_from_user_role):
-        return
+async def cb_back_lists(call: CallbackQuery):
     codes = await _load_user_lists(call.from_user.id)
     if not codes:
         await call.message.edit_text(
@@ -440,72 +464,45 @@ async def cb_back_lists(call: CallbackQuery, event_from_user_role: str | None =
     else:
         await call.message.edit_text(
             "Выберите список проблем:",
-            reply_markup=lists_menu(codes),
+            reply_markup=lists_menu(tuple(codes)),
         )
     await call.answer()
 
 
 # ===== Показ одного списка проблем =====
 
-@user_router.callback_query(F.data.startswith("user:plist_view:"))
-async def cb_view_list(call: CallbackQuery, event_from_user_role: str | None = None):
-    if not await guard_user(call, event_from_user_role):
-        return
-    list_code = call.data.split(":", 2)[2]
-    await _show_problems_in_list(call.message, list_code, call.from_user.id)
+@user_router.callback_query(UserCB.filter(F.action == "plist_view"))
+async def cb_view_list(call: CallbackQuery, callback_data: UserCB):
+    await _show_problems_in_list(call.message, callback_data.list_code, call.from_user.id)
     await call.answer()
 
 
-@user_router.callback_query(F.data.startswith("user:back_problems:"))
-async def cb_back_problems(call: CallbackQuery, event_from_user_role: str | None = None):
-    if not await guard_user(call, event_from_user_role):
-        return
-    list_code = call.data.split(":", 2)[2]
-    await _show_problems_in_list(call.message, list_code, call.from_user.id)
+@user_router.callback_query(UserCB.filter(F.action == "back_problems"))
+async def cb_back_problems(call: CallbackQuery, callback_data: UserCB):
+    await _show_problems_in_list(call.message, callback_data.list_code, call.from_user.id)
     await call.answer()
 
 
 # ===== Карточка проблемы =====
 
-@user_router.callback_query(F.data.startswith("user:problem:"))
+@user_router.callback_query(UserCB.filter(F.action == "problem"))
 async def cb_problem_detail(
     call: CallbackQuery,
-    event_from_user_role: str | None = None,
+    callback_data: UserCB,
 ):
-    if not await guard_user(call, event_from_user_role):
-        return
-
-    # callback_data: user:problem:<list_code>:<number>
-    try:
-        _, _, list_code, num_s = call.data.split(":", 3)
-        number = int(num_s)
-    except Exception:
+    list_code, number = callback_data.list_code, callback_data.number
+    if number is None:
         await call.answer("Некорректные данные кнопки.", show_alert=True)
         return
 
-    # грузим данные проблемы (важно, чтобы _load_problem_detail возвращал 'assignees')
-    p = await _load_problem_detail(list_code, number)
-    if not p:
+    p = await _load_problem_detail(list_code, number, for_assignee=call.from_user.id)
+    if p["state"] == "not_found":
         await call.message.edit_text("Эта проблема не найдена.")
         await call.answer()
         return
 
-    # список исполнителей (новый формат)
-    assignees: list[int] = p.get("assignees") or []
-
-    # на всякий случай — совместимость со старым форматом, если вдруг в словаре есть 'assignee'
-    if not assignees and "assignee" in p:
-        single = p.get("assignee")
-        if isinstance(single, int):
-            assignees = [single]
-        elif isinstance(single, (str, float)):
-            try:
-                assignees = [int(single)]
-            except (TypeError, ValueError):
-                assignees = []
-
     # если указаны исполнители — текущий пользователь должен быть среди них
-    if assignees and call.from_user.id not in assignees:
+    if p["state"] == "wrong_assignee":
         await call.message.edit_text(
             "⛔ Эта проблема назначена другим исполнителям.\n"
             "Вы не можете просматривать её детали и отправлять по ней отчёты."
@@ -521,23 +518,17 @@ async def cb_problem_detail(
     due_date = p.get("due_date") or "-"
 
     # красивый статус
-    status_map = {
-        "in_progress": "🟡 В работе",
-        "report_sent": "🟠 Отчёт отправлен",
-        "accepted": "🟢 Отчёт принят",
-        "rejected": "🔴 Отчёт отклонён",
-    }
-    status_human = status_map.get(status, status or "-")
+    status_human = STATUS_CARD_LABELS.get(status, status or "-")
 
     # текст карточки задачи
     text_lines = [
-        f"<b>Список:</b> {list_code}",
-        f"<b>Проблема №{number}:</b> {p.get('title') or ''}",
+        f"<b>Список:</b> {_h(list_code)}",
+        f"<b>Проблема №{number}:</b> {_h(p.get('title'))}",
         f"<b>Статус:</b> {status_human}",
-        f"<b>Срок:</b> {due_date}",
+        f"<b>Срок:</b> {_h(due_date)}",
     ]
     if note:
-        text_lines.append(f"<b>Примечание:</b> {note}")
+        text_lines.append(f"<b>Примечание:</b> {_h(note)}")
 
     text = "\n".join(text_lines)
 
@@ -550,41 +541,37 @@ async def cb_problem_detail(
 
 # ===== Запуск загрузки отчёта из карточки проблемы =====
 
-@user_router.callback_query(F.data.startswith("user:upload_for:"))
+@user_router.callback_query(UserCB.filter(F.action == "upload_for"))
 async def cb_upload_for_problem(
     call: CallbackQuery,
+    callback_data: UserCB,
     state: FSMContext,
-    event_from_user_role: str | None = None,
 ):
-    if not await guard_user(call, event_from_user_role):
+    list_code, number = callback_data.list_code, callback_data.number
+    if number is None:
+        await call.answer("Некорректные данные кнопки.", show_alert=True)
         return
 
-    # callback_data: user:upload_for:<list_code>:<number>
-    _, _, list_code, num_s = call.data.split(":", 3)
-    number = int(num_s)
-
-    p = await _load_problem_detail(list_code, number)
-    if not p:
+    p = await _load_problem_detail(
+        list_code, number, for_assignee=call.from_user.id, require_open=True
+    )
+    if p["state"] == "not_found":
         await call.message.edit_text("Эта проблема не найдена.")
         await call.answer()
         return
 
-    if p.get("is_closed"):
-        await call.message.edit_text("⛔ Список закрыт. Отчёты по этой проблеме не принимаются.")
-        await call.answer()
-        return
-
-    # тут _load_problem_detail ДОЛЖЕН вернуть:
-    #   "assignees": list[int]
-    assignees: list[int] = p.get("assignees") or []
-
-    if assignees and call.from_user.id not in assignees:
+    if p["state"] == "wrong_assignee":
         await call.message.edit_text(
             "⛔ Отчёт по этой проблеме могут отправлять только назначенные исполнители."
         )
         await call.answer()
         return
 
+    if p["state"] == "closed":
+        await call.message.edit_text("⛔ Список закрыт. Отчёты по этой проблеме не принимаются.")
+        await call.answer()
+        return
+
     await state.update_data(
         problem_id=int(p["id"]),
         problem_number=number,
@@ -593,7 +580,7 @@ async def cb_upload_for_problem(
     await state.set_state(ReportStates.waiting_payload)
 
     await call.message.edit_text(
-        f"Вы выбрали проблему №{number} из списка <b>{list_code}</b>.\n\n{ASK_DATA}"
+        f"Вы выбрали проблему №{number} из списка <b>{_h(list_code)}</b>.\n\n{ASK_DATA}"
     )
     await call.answer()
 
@@ -602,133 +589,122 @@ async def cb_upload_for_problem(
 # ===== Приём любого контента как отчёта =====
 
 @user_router.message(ReportStates.waiting_payload)
-async def receive_anything(msg: Message, state: FSMContext, event_from_user_role: str | None = None):
-    if not await guard_user(msg, event_from_user_role):
-        await state.clear()
-        return
-
+async def receive_anything(
+    msg: Message,
+    state: FSMContext,
+    session: AsyncSession,
+):
     data = await state.get_data()
     problem_id = int(data.get("problem_id"))
     problem_number = int(data.get("problem_number"))
     list_code = data.get("list_code")
 
-    # зарегистрируем пользователя и создадим Report
-    async with session_scope() as s:
-        user = await get_or_create_user(
-            s,
-            tg_id=msg.from_user.id,
-            username=msg.from_user.username,
-            first_name=msg.from_user.first_name,
-            last_name=msg.from_user.last_name,
-        )
-        report = await create_report(
-            s,
-            user_id=user.id,
-            problem_id=problem_id,
-            user_chat_id=msg.chat.id,
-            user_msg_id=msg.message_id,
-        )
-        report_id = report.id
-        # статус проблемы -> REPORT_SENT
-        await set_problem_status(s, problem_id, ProblemStatus.REPORT_SENT)
-
     caption = (getattr(msg, "caption", None) or msg.text or "").strip()
 
-    async def handle_content(file_id: str | None, kind: MediaType, filename: str):
-        file = await msg.bot.get_file(file_id) if file_id else None
-        if file:
-            raw = await msg.bot.download_file(file.file_path)
-            content = raw.read()
-        else:
-            content = (caption or "").encode("utf-8")
-
-        p1, p2, p3 = build_paths(problem_id, msg.from_user.id, report_id, filename)
-        save_bytes_to_all((p3,), content)
-
-        async with session_scope() as s:
-            await add_media(
-                s,
-                report_id=report_id,
-                kind=kind,
-                file_id=file_id,
-                file_path=str(p3),
-                caption=caption if caption else None,
-            )
-
     # определяем тип контента
+    file_id: str | None = None
     if msg.photo:
         photo = msg.photo[-1]
-        await handle_content(photo.file_id, MediaType.PHOTO, f"photo_{photo.file_unique_id}.jpg")
+        file_id, kind, filename = photo.file_id, MediaType.PHOTO, f"photo_{photo.file_unique_id}.jpg"
     elif msg.video:
-        await handle_content(msg.video.file_id, MediaType.VIDEO, f"video_{msg.video.file_unique_id}.mp4")
+        file_id, kind, filename = msg.video.file_id, MediaType.VIDEO, f"video_{msg.video.file_unique_id}.mp4"
     elif msg.document:
-        await handle_content(
-            msg.document.file_id,
-            MediaType.DOCUMENT,
-            msg.document.file_name or f"document_{msg.document.file_unique_id}",
-        )
+        file_id, kind = msg.document.file_id, MediaType.DOCUMENT
+        filename = msg.document.file_name or f"document_{msg.document.file_unique_id}"
     elif msg.audio:
-        await handle_content(
-            msg.audio.file_id,
-            MediaType.AUDIO,
-            msg.audio.file_name or f"audio_{msg.audio.file_unique_id}.mp3",
-        )
+        file_id, kind = msg.audio.file_id, MediaType.AUDIO
+        filename = msg.audio.file_name or f"audio_{msg.audio.file_unique_id}.mp3"
     elif msg.voice:
-        await handle_content(msg.voice.file_id, MediaType.VOICE, f"voice_{msg.voice.file_unique_id}.ogg")
+        file_id, kind, filename = msg.voice.file_id, MediaType.VOICE, f"voice_{msg.voice.file_unique_id}.ogg"
     elif msg.text:
-        await handle_content(None, MediaType.TEXT, "message.txt")
+        kind, filename = MediaType.TEXT, "message.txt"
     else:
-        await handle_content(None, MediaType.OTHER, "payload.bin")
+        kind, filename = MediaType.OTHER, "payload.bin"
 
-    # ===== общий текст для админов и группы =====
-    user_caption = caption or ""
-    info_block = (
-        f"Новый отчёт #{report_id}\n"
-        f"Список: {list_code}\n"
-        f"Проблема №{problem_number}\n"
-        f"От пользователя: {msg.from_user.id}"
-    )
-    if user_caption:
-        admin_caption = info_block + f"\n\nПодпись пользователя:\n{user_caption}"
+    # сохраняем до транзакции, чтобы не держать соединение с БД на время сети/диска;
+    # файл пишется на диск потоком, без копии целиком в памяти
+    p3 = await asyncio.to_thread(build_user_path, problem_id, msg.from_user.id, filename)
+    if file_id:
+        await msg.bot.download(file_id, destination=p3)
     else:
-        admin_caption = info_block
+        await asyncio.to_thread(p3.write_text, caption, encoding="utf-8")
+
+    # одна транзакция: пользователь, отчёт, статус задачи, медиа и список админов
+    user = await get_or_create_user(
+        session,
+        tg_id=msg.from_user.id,
+        username=msg.from_user.username,
+        first_name=msg.from_user.first_name,
+        last_name=msg.from_user.last_name,
+    )
+    report = await create_report(
+        session,
+        user_id=user.id,
+        problem_id=problem_id,
+        user_chat_id=msg.chat.id,
+        user_msg_id=msg.message_id,
+    )
+    report_id = report.id
+    # статус проблемы -> REPORT_SENT
+    await set_problem_status(session, problem_id, ProblemStatus.REPORT_SENT)
+
+    await add_media(
+        session,
+        report_id=report_id,
+        kind=kind,
+        file_id=file_id,
+        file_path=str(p3),
+        caption=caption if caption else None,
+    )
 
-    # ===== нотифицируем админов =====
-    async with session_scope() as s:
-        admins = (
-            await s.execute(
-                select(MUser.id).where(MUser.role == Role.ADMIN)
-            )
-        ).scalars().all()
+    admins = await get_admin_ids(session)
+    topic_id = await _get_group_topic_for_list(session, list_code)
 
-    from config import BOOTSTRAP_ADMIN_IDS
-    main_set = set(BOOTSTRAP_ADMIN_IDS)
-    regular_admins = [aid for aid in admins if aid not in main_set]
+    # коммитим до рассылки: админ может нажать "Принять" сразу после получения копии
+    await session.commit()
+    user_lists_cache.invalidate(msg.from_user.id)
+    user_stats_cache.invalidate(msg.from_user.id)
+
+    # ===== общий текст для админов и группы =====
+    # подпись и код списка вводят люди — экранируем, иначе parse_mode=HTML
+    # уронит copy_to на первом же "<" или "&"
+    parts = [
+        f"Новый отчёт #{report_id}",
+        f"Список: {_h(list_code)}",
+        f"Проблема №{problem_number}",
+        f"От пользователя: {msg.from_user.id}",
+    ]
+    if caption:
+        parts += ["", "Подпись пользователя:", _h(caption)]
+    admin_caption = "\n".join(parts)
+
+    # ===== нотифицируем админов =====
+    regular_admins, _ = split_admins(admins)
 
     # На первом этапе шлём ТОЛЬКО обычным админам
-    for admin_id in regular_admins:
-        try:
-            await msg.copy_to(
-                chat_id=admin_id,
-                caption=admin_caption + "\n\nЭтап 1/2: подтверждение админами.",
-                reply_markup=review_kb(report_id, msg.from_user.id),
-            )
-        except Exception:
-            pass
+    stage1_caption = admin_caption + "\n\nЭтап 1/2: подтверждение админами."
+    kb = review_kb(report_id, msg.from_user.id)
+    sends = [
+        partial(msg.copy_to, chat_id=admin_id, caption=stage1_caption, reply_markup=kb)
+        for admin_id in regular_admins
+    ]
 
     # ===== дублируем отчёт в тему группы (уже существующую) =====
-    try:
-        topic_id = await _get_group_topic_for_list(list_code)
-        if topic_id:
-            # в группу отправляем без кнопок модерации
-            await msg.copy_to(
+    if topic_id:
+        # в группу отправляем без кнопок модерации
+        sends.append(
+            partial(
+                msg.copy_to,
                 chat_id=GROUP_CHAT_ID,
                 message_thread_id=topic_id,
                 caption=admin_caption,
             )
-    except Exception:
-        # если нет прав/тем или GROUP_CHAT_ID неверный – просто промолчим
-        pass
+        )
+
+    # все копии уходят параллельно; недоставленные (нет прав/тем, бот заблокирован) логируются.
+    # copyMessage не перезаливает медиа, а пакетный forward_messages работает только
+    # в пределах одного чата и не умеет подпись/кнопки — поэтому по одному вызову на чат
+    await fan_out(sends)
 
     await msg.answer(REPORT_SENT, reply_markup=main_menu())
     await state.clear()
@@ -737,14 +713,14 @@ async def receive_anything(msg: Message, state: FSMContext, event_from_user_role
 # ===== Статистика пользователя =====
 
 @user_router.callback_query(F.data == "user:stats")
-async def cb_stats(call: CallbackQuery, event_from_user_role: str | None = None):
-    if not await guard_user(call, event_from_user_role):
-        return
-
-    async with session_scope() as s:
-        st = await user_stats(s, call.from_user.id)
+async def cb_stats(call: CallbackQuery):
+    async def load() -> str:
+        async with session_scope() as s:
+            st = await user_stats(s, call.from_user.id)
+        return USER_STATS.format(**st)
 
-    new_text = USER_STATS.format(**st)
+    # повторные нажатия в течение USER_STATS_TTL не ходят в БД
+    new_text = await user_stats_cache.get_or_load(call.from_user.id, load)
 
     # если сообщение уже с таким же текстом – не редактируем
     current_text = call.message.text or call.message.caption or ""
@@ -754,36 +730,21 @@ async def cb_stats(call: CallbackQuery, event_from_user_role: str | None = None)
         await call.answer("Статистика уже актуальна ✅", show_alert=False)
         return
 
-    try:
-        # если это обычный текст – edit_text
-        if call.message.text is not None:
-            await call.message.edit_text(new_text, reply_markup=main_menu())
-        else:
-            # вдруг это было медиа с подписью
-            await call.message.edit_caption(new_text, reply_markup=main_menu())
-    except TelegramBadRequest as e:
-        # на всякий случай гасим "message is not modified", если вдруг Telegram решит ещё раз придраться
-        if "message is not modified" not in str(e):
-            raise
+    await edit_with_fallback(call.message, new_text, reply_markup=main_menu())
 
     await call.answer("Обновлено ✅", show_alert=False)
 
 # ===== Пагинация =====
-@user_router.callback_query(F.data.startswith("user:plist_page:"))
-async def cb_view_list_page(call: CallbackQuery, event_from_user_role: str | None = None):
+@user_router.callback_query(UserCB.filter(F.action == "plist_page"))
+async def cb_view_list_page(call: CallbackQuery, callback_data: UserCB):
     """
     Листание страниц задач в одном списке.
     callback_data: user:plist_page:<list_code>:<page>
     """
-    if not await guard_user(call, event_from_user_role):
-        return
-
-    try:
-        _, _, list_code, page_s = call.data.split(":", 3)
-        page = int(page_s)
-    except Exception:
+    page = callback_data.number
+    if page is None:
         await call.answer("Некорректная страница.", show_alert=True)
         return
 
-    await _show_problems_in_list(call.message, list_code, call.from_user.id, page=page)
+    await _show_problems_in_list(call.message, callback_data.list_code, call.from_user.id, page=page)
     await call.answer()
\ No newline at end of file
@@ -1,7 +1,37 @@
 
+from aiogram.filters.callback_data import CallbackData
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+
+class ReviewCB(CallbackData, prefix="admin"):
+    """admin:<accept|reject>:<report_id>:<user_tg_id>"""
+    action: str
+    report_id: int
+    user_tg_id: int
+
+
+def list_cb(action: str, list_code: str) -> str:
+    """admin:<stats_problems_list|del_plist|del_plist_do>:<list_code>
+
+    Код списка — свободный текст и может содержать ':', поэтому не CallbackData:
+    его pack() на ':' падает. Разбирается через list_code_from_cb.
+    """
+    return f"admin:{action}:{list_code}"
+
+
+def list_code_from_cb(data: str) -> str:
+    # maxsplit=2: всё после второго ':' — код списка, вместе с его ':'
+    return data.split(":", 2)[2]
+
+
 def review_kb(report_id: int, user_id: int) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=[[
-        InlineKeyboardButton(text="✅ Принять", callback_data=f"admin:accept:{report_id}:{user_id}"),
-        InlineKeyboardButton(text="❌ Отклонить", callback_data=f"admin:reject:{report_id}:{user_id}"),
+        InlineKeyboardButton(
+            text="✅ Принять",
+            callback_data=ReviewCB(action="accept", report_id=report_id, user_tg_id=user_id).pack(),
+        ),
+        InlineKeyboardButton(
+            text="❌ Отклонить",
+            callback_data=ReviewCB(action="reject", report_id=report_id, user_tg_id=user_id).pack(),
+        ),
     ]])
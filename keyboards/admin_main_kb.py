@@ -1,5 +1,8 @@
+from functools import cache
+
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
+@cache
 def admin_main_menu() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="📤 Загрузить таблицу проблем", callback_data="admin:upload_problems")],
@@ -1,5 +1,8 @@
+from functools import cache
+
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
+@cache
 def admins_menu() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=[
         [
@@ -9,6 +12,7 @@ def admins_menu() -> InlineKeyboardMarkup:
         [InlineKeyboardButton(text="⬅️ Назад", callback_data="admin:back_main")],
     ])
 
+@cache
 def cancel_kb() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="✖️ Отмена", callback_data="admin:cancel")],
@@ -1,5 +1,41 @@
 
+from functools import cache
+
+from aiogram.filters.callback_data import CallbackData
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+
+def _escape_code(code: str) -> str:
+    # "%" — первым, иначе экранирование ":" само превратится в "%253A"
+    return code.replace("%", "%25").replace(":", "%3A")
+
+
+def _unescape_code(code: str) -> str:
+    # в экранированном коде каждый "%" начинает "%25" или "%3A" — порядок замен безопасен
+    return code.replace("%3A", ":").replace("%25", "%")
+
+
+class UserCB(CallbackData, prefix="user"):
+    """user:<action>:<list_code>:<number|page>
+
+    Код списка — свободный текст: ":" (разделитель полей, pack() на нём падает)
+    и "%" в нём экранируются. Коды без них упаковываются как раньше —
+    уже отправленные кнопки продолжают работать.
+    """
+    action: str
+    list_code: str
+    number: int | None = None
+
+    def pack(self) -> str:
+        escaped = self.model_copy(update={"list_code": _escape_code(self.list_code)})
+        return CallbackData.pack(escaped)
+
+    @classmethod
+    def unpack(cls, value: str) -> "UserCB":
+        cb = super().unpack(value)
+        return cb.model_copy(update={"list_code": _unescape_code(cb.list_code)})
+
+@cache
 def main_menu() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="📋 Список проблем", callback_data="user:problems")],
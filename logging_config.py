@@ -1,10 +1,15 @@
 # logging_config.py
 from __future__ import annotations
 
+import atexit
 import logging
-from logging.handlers import TimedRotatingFileHandler
+import queue
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
 from pathlib import Path
 
+# поток, который пишет логи в консоль/файлы (см. setup_logging)
+_listener: QueueListener | None = None
+
 
 def setup_logging() -> None:
     """
@@ -13,6 +18,9 @@ def setup_logging() -> None:
       - файл logs/bot.log (INFO+);
       - файл logs/errors.log (ERROR+);
       оба файла ротируются раз в сутки.
+
+    Сами записи (и ротация в полночь) идут в отдельном потоке QueueListener:
+    на event loop логгер только кладёт запись в очередь.
     """
     log_dir = Path("logs")
     log_dir.mkdir(parents=True, exist_ok=True)
@@ -33,7 +41,6 @@ def setup_logging() -> None:
     # --- консоль ---
     console = logging.StreamHandler()
     console.setFormatter(fmt)
-    root.addHandler(console)
 
     # --- файл со всеми уровнями (INFO+) ---
     all_file = TimedRotatingFileHandler(
@@ -46,7 +53,6 @@ def setup_logging() -> None:
     )
     all_file.setFormatter(fmt)
     all_file.setLevel(logging.INFO)
-    root.addHandler(all_file)
 
     # --- файл только с ошибками (ERROR+) ---
     err_file = TimedRotatingFileHandler(
@@ -59,7 +65,18 @@ def setup_logging() -> None:
     )
     err_file.setFormatter(fmt)
     err_file.setLevel(logging.ERROR)
-    root.addHandler(err_file)
+
+    # на root — только очередь; прежние хендлеры (basicConfig) убираем,
+    # иначе они продолжат писать синхронно и задвоят консоль
+    global _listener
+    log_queue: queue.Queue = queue.Queue(-1)
+    for h in root.handlers[:]:
+        root.removeHandler(h)
+    root.addHandler(QueueHandler(log_queue))
+
+    _listener = QueueListener(log_queue, console, all_file, err_file, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
 
     # пометили, что уже настроили
     root._logging_already_configured = True
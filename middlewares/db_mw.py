@@ -0,0 +1,27 @@
+from typing import Callable, Dict, Any, Awaitable
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import TelegramObject
+
+from db import SessionLocal
+
+class DbSessionMiddleware(BaseMiddleware):
+    """
+    Одна AsyncSession на апдейт — хендлер получает её аргументом `session`.
+
+    COMMIT делается только для хендлеров с флагом @flags.db_commit;
+    читающие хендлеры обходятся без лишнего COMMIT, а соединение
+    берётся из пула только при первом запросе.
+    """
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        async with SessionLocal() as session:
+            data["session"] = session
+            result = await handler(event, data)
+            if get_flag(data, "db_commit"):
+                await session.commit()
+            return result
@@ -3,8 +3,7 @@ from aiogram import BaseMiddleware
 from aiogram.types import TelegramObject, User as TgUser
 
 from db import session_scope
-from crud import get_or_create_user, ensure_bootstrap_admins
-from config import BOOTSTRAP_ADMIN_IDS
+from crud import get_or_create_user, user_role_cache
 
 class RoleMiddleware(BaseMiddleware):
     async def __call__(
@@ -18,17 +17,20 @@ class RoleMiddleware(BaseMiddleware):
         if tg_user is None:
             return await handler(event, data)
 
-        async with session_scope() as s:
-            if BOOTSTRAP_ADMIN_IDS:
-                await ensure_bootstrap_admins(s, BOOTSTRAP_ADMIN_IDS)
-            u = await get_or_create_user(
-                s,
-                tg_id=tg_user.id,
-                username=tg_user.username,
-                first_name=tg_user.first_name,
-                last_name=tg_user.last_name,
-            )
-            role = getattr(u.role, "value", str(u.role))
+        async def load() -> str:
+            async with session_scope() as s:
+                u = await get_or_create_user(
+                    s,
+                    tg_id=tg_user.id,
+                    username=tg_user.username,
+                    first_name=tg_user.first_name,
+                    last_name=tg_user.last_name,
+                )
+                return getattr(u.role, "value", str(u.role))
+
+        # роль меняется редко — в БД идём только при промахе кэша;
+        # главных админов создаёт ensure_bootstrap_admins при старте бота
+        role = await user_role_cache.get_or_load(tg_user.id, load)
 
         data["event_from_user_role"] = role  # "admin" | "user"
         return await handler(event, data)
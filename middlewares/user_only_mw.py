@@ -0,0 +1,33 @@
+from typing import Callable, Dict, Any, Awaitable
+from aiogram import BaseMiddleware
+from aiogram.fsm.context import FSMContext
+from aiogram.types import TelegramObject, CallbackQuery
+
+DENIED_TEXT = "Эта функция доступна только пользователям."
+
+
+class UserOnlyMiddleware(BaseMiddleware):
+    """
+    Пускает к хендлерам роутера только роль "user" (роль кладёт RoleMiddleware).
+
+    Вешается как inner-middleware: срабатывает уже после фильтров,
+    т.е. отказ получает только тот, чей апдейт действительно попал в хендлер.
+    """
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        if data.get("event_from_user_role") == "user":
+            return await handler(event, data)
+
+        if isinstance(event, CallbackQuery):
+            await event.answer(DENIED_TEXT, show_alert=True)
+        else:
+            await event.answer(DENIED_TEXT)
+            # не оставляем чужую роль в состоянии ожидания отчёта
+            state: FSMContext | None = data.get("state")
+            if state is not None:
+                await state.clear()
+        return None
@@ -2,9 +2,10 @@
 from __future__ import annotations
 from datetime import datetime
 from enum import StrEnum
+from functools import lru_cache
 from typing import Optional, List
 from sqlalchemy.orm import DeclarativeBase, mapped_column, Mapped, relationship
-from sqlalchemy import ForeignKey, String, DateTime, Enum, Integer, Text, UniqueConstraint, BigInteger, Boolean
+from sqlalchemy import ForeignKey, String, DateTime, Enum, Integer, Text, UniqueConstraint, BigInteger, Boolean, Index, text
 
 
 class Base(DeclarativeBase): pass
@@ -40,12 +41,32 @@ class ProblemList(Base):
         cascade="all, delete-orphan",
     )
 
+    # открытые списки по коду: меню пользователя
+    __table_args__ = (Index("ix_problem_lists_closed_code", "is_closed", "code"),)
+
 class ProblemStatus(StrEnum):
     IN_PROGRESS   = "in_progress"      # 1. в работе
     REPORT_SENT   = "report_sent"      # 2. отправлен отчет
     ACCEPTED      = "accepted"         # 3. отчет принят
     REJECTED      = "rejected"         # 4. отчет отклонен
 
+@lru_cache(maxsize=4096)
+def split_assignees(raw: str) -> tuple[int, ...]:
+    # ключ — сама строка: кэш не устаревает ни при setter'е, ни при записи assignees_raw напрямую
+    ids: list[int] = []
+    for part in raw.split(","):
+        p = part.strip()
+        if not p:
+            continue
+        try:
+            ids.append(int(p))
+        except ValueError:
+            continue
+    return tuple(ids)
+
+
+_OPEN_STATUSES_SQL = "status IN ('IN_PROGRESS', 'REPORT_SENT', 'REJECTED')"
+
 class Problem(Base):
     __tablename__ = "problems"
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
@@ -55,29 +76,34 @@ class Problem(Base):
     # assignee: Mapped[int | None] = mapped_column(BigInteger)                  # TG id
     assignees_raw: Mapped[str | None] = mapped_column("assignees", Text, nullable=True)
     due_date: Mapped[str | None] = mapped_column(String(32))
-    status: Mapped[ProblemStatus] = mapped_column(Enum(ProblemStatus), default=ProblemStatus.IN_PROGRESS)  # <-- статус
+    # индекс — для выборок по статусу через все списки (акты, напоминания)
+    status: Mapped[ProblemStatus] = mapped_column(Enum(ProblemStatus), default=ProblemStatus.IN_PROGRESS, index=True)  # <-- статус
     note: Mapped[str | None] = mapped_column(Text)                            # <-- примечание (причина отклонения)
 
     plist: Mapped["ProblemList"] = relationship(back_populates="problems")
     reports: Mapped[List["Report"]] = relationship(back_populates="problem")
 
-    __table_args__ = (UniqueConstraint("list_id", "number", name="uix_problem_list_number"),)
+    __table_args__ = (
+        UniqueConstraint("list_id", "number", name="uix_problem_list_number"),
+        # задачи списка в нужных статусах сразу в порядке номеров
+        Index("ix_problems_list_status_number", "list_id", "status", "number"),
+        # напоминания: статус + диапазон сроков (due_date — строка ISO, сравнивается лексически)
+        Index("ix_problems_status_due", "status", "due_date"),
+        # частичный индекс только по незакрытым задачам — для меню пользователя;
+        # Enum хранит имена членов, поэтому в условии — имена, а не значения
+        Index(
+            "ix_problems_open_list_number", "list_id", "number",
+            postgresql_where=text(_OPEN_STATUSES_SQL),
+            sqlite_where=text(_OPEN_STATUSES_SQL),
+        ),
+    )
 
     # Удобное свойство: список ID
     @property
     def assignees(self) -> list[int]:
         if not self.assignees_raw:
             return []
-        ids: list[int] = []
-        for part in self.assignees_raw.split(","):
-            p = part.strip()
-            if not p:
-                continue
-            try:
-                ids.append(int(p))
-            except ValueError:
-                continue
-        return ids
+        return list(split_assignees(self.assignees_raw))
 
     @assignees.setter
     def assignees(self, values: list[int] | None) -> None:
@@ -87,6 +113,24 @@ class Problem(Base):
             self.assignees_raw = ",".join(str(v) for v in values)
 
 
+class ProblemAssignee(Base):
+    """
+    Исполнитель задачи — по строке на пару (задача, TG id).
+    Дублирует Problem.assignees_raw, чтобы искать задачи пользователя по индексу,
+    а не LIKE по строке; синхронизируется в crud.upsert_problems.
+    """
+    __tablename__ = "problem_assignees"
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    problem_id: Mapped[int] = mapped_column(ForeignKey("problems.id", ondelete="CASCADE"))
+    user_tg_id: Mapped[int] = mapped_column(BigInteger)
+
+    __table_args__ = (
+        UniqueConstraint("problem_id", "user_tg_id", name="uix_problem_assignee"),
+        Index("ix_pa_user", "user_tg_id", "problem_id"),
+    )
+
+
 class ReportDecision(StrEnum):
     APPROVED = "approved"
     REJECTED = "rejected"
@@ -99,8 +143,9 @@ class Report(Base):
     id: Mapped[int]=mapped_column(primary_key=True,autoincrement=True)
     user_id: Mapped[int]=mapped_column(ForeignKey("users.id"))
     problem_id: Mapped[int]=mapped_column(ForeignKey("problems.id"))
-    user_chat_id: Mapped[int]=mapped_column(Integer)
-    user_msg_id: Mapped[int]=mapped_column(Integer)
+    # Telegram ID чатов выходят за 32 бита
+    user_chat_id: Mapped[int]=mapped_column(BigInteger)
+    user_msg_id: Mapped[int]=mapped_column(BigInteger)
     status: Mapped[ReportStatus]=mapped_column(Enum(ReportStatus),default=ReportStatus.PENDING)
     admin_reason: Mapped[Optional[str]]=mapped_column(Text)
     admin_id: Mapped[Optional[int]]=mapped_column(ForeignKey("users.id"))
@@ -129,6 +174,8 @@ class ReportReview(Base):
 
     __table_args__ = (
         UniqueConstraint("report_id", "admin_id", name="uix_report_admin"),
+        # подсчёт голосов по отчёту (get_review_flags, сводка) — только по индексу
+        Index("ix_review_report_decision", "report_id", "decision", "admin_id"),
     )
 
     report: Mapped["Report"] = relationship(back_populates="reviews")
@@ -1,15 +1,19 @@
+import asyncio
 import os
+from functools import partial
 from datetime import date, datetime
 
 from aiogram import Bot
 from aiogram.types import FSInputFile
-from docxtpl import DocxTemplate
-from sqlalchemy import select, or_
+from sqlalchemy import select, insert
 
 from db import session_scope
-from crud import get_problems_for_reminder
+from crud import get_problems_for_reminder, get_problems_for_acts
 from keyboards.admin_main_kb import admin_main_menu
-from models import Staff, ActEntry, Problem, ProblemList, ProblemStatus
+from models import Staff, ActEntry, ProblemList
+from utils.acts import act_template_bytes, render_act
+from texts import REMINDER_TEXT
+from utils.telegram import fan_out
 
 
 async def send_due_reminders(bot: Bot):
@@ -19,33 +23,26 @@ async def send_due_reminders(bot: Bot):
     async with session_scope() as s:
         items = await get_problems_for_reminder(s, today)
 
-    # здесь НЕТ ORM-объектов, только обычные dict — ничего не "отвалится" от сессии
+    calls = []
+
+    # здесь НЕТ ORM-объектов, только обычные dict — ничего не "отвалится" от сессии;
+    # окно 0..3 дня уже отфильтровано в get_problems_for_reminder
     for item in items:
-        number      = item["number"]
-        title       = item["title"]
-        due         = item["due_date"]      # уже date
-        days_left   = item["days_left"]
-        assignees   = item["assignees"]     # list[int]
-        plist_title = item["plist_title"]
-        plist_code  = item["plist_code"]
-
-        # на всякий случай ещё раз фильтр, но можно и убрать:
-        if not (0 <= days_left <= 3):
-            continue
-
-        text_base = (
-            f"⏰ Напоминание по задаче #{number} из списка "
-            f"«{plist_title or plist_code}».\n\n"
-            f"Описание: {title}\n"
-            f"Срок исполнения: {due.strftime('%Y-%m-%d')}."
+        text_base = REMINDER_TEXT.format(
+            number=item["number"],
+            plist=item["plist_title"] or item["plist_code"],
+            title=item["title"],
+            due=item["due_date"].isoformat(),  # уже date
+        )
+
+        calls.extend(
+            partial(bot.send_message, chat_id=tg_id, text=text_base)
+            for tg_id in item["assignees"]
         )
 
-        for tg_id in assignees:
-            try:
-                await bot.send_message(chat_id=tg_id, text=text_base)
-            except Exception:
-                # пользователь мог заблокировать бота и т.п. — просто пропускаем
-                continue
+    # рассылаем параллельно в пределах лимитов Telegram; ошибки
+    # (пользователь заблокировал бота и т.п.) fan_out только логирует
+    await fan_out(calls)
 
 
 async def cb_admin_create_akt_by_staff(
@@ -65,9 +62,13 @@ async def cb_admin_create_akt_by_staff(
 
     # папка для временных файлов
     os.makedirs("temp", exist_ok=True)
-    doc_path = "shablon/akt.docx"
 
-    total_acts = 0
+    # шаблон читаем один раз на все акты (и между запусками, пока файл не изменился)
+    try:
+        tpl_bytes = act_template_bytes()
+    except OSError as e:
+        print(f"❌ Не удалось открыть шаблон акта: {e}")
+        return
 
     async with session_scope() as s:
         # 1) Берём всех сотрудников
@@ -75,37 +76,14 @@ async def cb_admin_create_akt_by_staff(
             await s.execute(select(Staff).order_by(Staff.fio))
         ).scalars().all()
 
+        # 2) Задачи без акта по первому исполнителю — одной выборкой на всех
+        todo = await get_problems_for_acts(s)
+        # (context, out_path, tg_id, caption, id задач акта)
+        jobs: list[tuple[dict, str, int, str, list[int]]] = []
+
         for staff in staff_rows:
             tg_id = staff.assignee
-
-            # --- подзапрос: есть ли уже акт по этой задаче и этому исполнителю
-            act_exists = (
-                select(ActEntry.id)
-                .where(
-                    ActEntry.problem_id == Problem.id,
-                    ActEntry.assignee == tg_id,
-                )
-                .exists()
-            )
-
-            # 2) Ищем задачи, где этот tg_id стоит ПЕРВЫМ в assignees_raw
-            #    и статус == ACCEPTED
-            #    и для них ещё нет записи в Acts
-            stmt = (
-                select(Problem, ProblemList)
-                .join(ProblemList, Problem.list_id == ProblemList.id)
-                .where(
-                    Problem.status == ProblemStatus.ACCEPTED,
-                    Problem.assignees_raw.isnot(None),
-                    or_(
-                        Problem.assignees_raw == str(tg_id),
-                        Problem.assignees_raw.like(f"{tg_id},%"),
-                    ),
-                    ~act_exists,  # <<< акт ещё не формировался
-                )
-                .order_by(ProblemList.code, Problem.number)
-            )
-            rows = (await s.execute(stmt)).all()
+            rows = todo.get(tg_id)
 
             if not rows:
                 continue  # у этого сотрудника нет новых принятых задач – пропускаем
@@ -131,38 +109,41 @@ async def cb_admin_create_akt_by_staff(
                 "fio": staff.fio,
             }
 
-            # 5) Рендерим docx по шаблону
-            try:
-                doc = DocxTemplate(doc_path)
-            except Exception as e:
-                print(f"❌ Не удалось открыть шаблон акта: {e}")
-                return
-
-            doc.render(context)
-
-            # имя файла: akt_<fio_or_id>.docx
+            # 5) Имя файла: akt_<code>_<fio_or_id>.docx; рендер — после цикла
             safe_fio = (staff.fio or str(tg_id)).replace(" ", "_")
             filename = f"akt_{list_code}_{safe_fio}.docx"
+            if any(j[1] == os.path.join("temp", filename) for j in jobs):
+                # рендер параллельный — однофамильцы не должны писать в один файл
+                filename = f"akt_{list_code}_{safe_fio}_{tg_id}.docx"
             out_path = os.path.join("temp", filename)
 
-            doc.save(out_path)
-            total_acts += 1
-
-            # 6) Запоминаем, что по этим задачам и этому исполнителю акт уже сформирован
-            for prob, _plist in rows:
-                s.add(
-                    ActEntry(
-                        problem_id=prob.id,
-                        assignee=tg_id,
-                    )
-                )
-
-            # можно коммитить пачками, но одного в конце контекста обычно достаточно.
-            # я добавлю явный коммит после цикла по staff.
-            await bot.send_document(chat_id=tg_id,
-                document=FSInputFile(out_path),
-                caption=f"Акт для {staff.fio or tg_id}",
-            )
-
-        # фиксируем все ActEntry
-        await s.commit()
\ No newline at end of file
+            jobs.append((
+                context, out_path, tg_id, f"Акт для {staff.fio or tg_id}",
+                [prob.id for prob, _plist in rows],
+            ))
+
+    # 6) Рендер docx (jinja + lxml) — CPU-работа: в потоках и параллельно,
+    #    event loop бота в это время продолжает обрабатывать апдейты;
+    #    соединение с БД на время рендера и отправки уже отпущено
+    await asyncio.gather(*(
+        asyncio.to_thread(render_act, tpl_bytes, context, out_path)
+        for context, out_path, *_ in jobs
+    ))
+
+    results = await fan_out(
+        partial(bot.send_document, chat_id=tg_id, document=FSInputFile(out_path), caption=caption)
+        for _context, out_path, tg_id, caption, _ids in jobs
+    )
+
+    # 7) Акт считается сформированным, только если он дошёл до сотрудника
+    act_rows = [
+        {"problem_id": pid, "assignee": tg_id}
+        for (_context, _path, tg_id, _caption, ids), res in zip(jobs, results)
+        if not isinstance(res, Exception)
+        for pid in ids
+    ]
+
+    # 8) Фиксируем ActEntry одним executemany; если фиксировать нечего — в БД не идём
+    if act_rows:
+        async with session_scope() as s:
+            await s.execute(insert(ActEntry), act_rows)
\ No newline at end of file
@@ -0,0 +1,19 @@
+import pytest
+
+pytest.importorskip("aiogram")
+
+from keyboards.admin_kb import ReviewCB, list_cb, list_code_from_cb
+
+
+@pytest.mark.parametrize("action", ["stats_problems_list", "del_plist", "del_plist_do"])
+@pytest.mark.parametrize("code", ["2024", "ЛОТ-1:этап:2", "a:"])
+def test_list_code_with_colon_roundtrip(action, code):
+    data = list_cb(action, code)
+    assert data.startswith(f"admin:{action}:")
+    assert list_code_from_cb(data) == code
+
+
+def test_list_cb_not_taken_by_review_filter():
+    # "admin:del_plist:1:2" разбирается ReviewCB, но action не accept/reject
+    cb = ReviewCB.unpack(list_cb("del_plist", "1:2"))
+    assert cb.action not in ("accept", "reject")
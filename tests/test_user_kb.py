@@ -0,0 +1,19 @@
+import pytest
+
+pytest.importorskip("aiogram")
+
+from keyboards.user_kb import UserCB
+
+
+@pytest.mark.parametrize("code", ["2024", "ЛОТ-1:этап:2", "a:", "100%", "%3A", "50%:x"])
+@pytest.mark.parametrize("number", [None, 7])
+def test_list_code_with_colon_roundtrip(code, number):
+    data = UserCB(action="problem", list_code=code, number=number).pack()
+    cb = UserCB.unpack(data)
+    assert cb.list_code == code
+    assert cb.number == number
+
+
+def test_plain_code_packs_as_before():
+    # кнопки, отправленные до экранирования, должны разбираться так же
+    assert UserCB(action="upload_for", list_code="2024", number=3).pack() == "user:upload_for:2024:3"
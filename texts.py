@@ -19,4 +19,9 @@ USER_STATS = (
     "Отчёт отправлен, ждёт проверки: {sent}\n"
     "Принято: {accepted}\n"
     "Отклонено: {rejected}\n"
-)
\ No newline at end of file
+)
+REMINDER_TEXT = (
+    "⏰ Напоминание по задаче #{number} из списка «{plist}».\n\n"
+    "Описание: {title}\n"
+    "Срок исполнения: {due}."
+)
@@ -0,0 +1,26 @@
+
+import os
+from functools import lru_cache
+from io import BytesIO
+
+from docxtpl import DocxTemplate
+
+AKT_TEMPLATE = "shablon/akt.docx"
+
+
+@lru_cache(maxsize=4)
+def _read_template(path: str, mtime: float) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def act_template_bytes(path: str = AKT_TEMPLATE) -> bytes:
+    # файл шаблона читаем один раз; mtime в ключе — подхватываем замену шаблона без рестарта
+    return _read_template(path, os.stat(path).st_mtime)
+
+
+def render_act(tpl_bytes: bytes, context: dict, out_path: str) -> None:
+    # DocxTemplate меняет документ при render — на каждый акт свой экземпляр из байтов в памяти
+    doc = DocxTemplate(BytesIO(tpl_bytes))
+    doc.render(context)
+    doc.save(out_path)
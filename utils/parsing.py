@@ -1,16 +1,32 @@
 
 import csv
+import hashlib
 import io
+from collections import OrderedDict
 from io import StringIO, BytesIO
 from typing import Iterable, Iterator, Dict, Any
 import datetime as dt
 from datetime import datetime, date
+from functools import lru_cache
 
 try:
     from openpyxl import load_workbook
 except Exception:
     load_workbook = None
 
+@lru_cache(maxsize=2048)
+def iso_to_date(value: str) -> date:
+    """
+    'YYYY-MM-DD' -> date (ValueError, если это не дата).
+    Сроков в базе немного и они повторяются — разбор кэшируем.
+    """
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        # strptime терпимее к записи без ведущих нулей: 2024-1-5
+        return datetime.strptime(value, "%Y-%m-%d").date()
+
+
 def detect_delimiter(sample: str) -> str:
     return ";" if ";" in sample and sample.count(";") >= sample.count(",") else ","
 
@@ -21,7 +37,7 @@ def _parse_due_date(value: str | None):
     if not value:
         return None
     # формат YYYY-MM-DD
-    return dt.datetime.strptime(value, "%Y-%m-%d").date()
+    return iso_to_date(value)
 
 
 def _to_date(value):
@@ -36,7 +52,7 @@ def _to_date(value):
         return None
     # пробуем YYYY-MM-DD
     try:
-        return dt.datetime.strptime(s, "%Y-%m-%d").date()
+        return iso_to_date(s)
     except ValueError:
         return None
 
@@ -45,18 +61,35 @@ def parse_problems_csv(data: bytes) -> Iterator[dict]:
     Ожидаемый CSV-хедер:
     list_code,number,title,assignee,due_date
     """
-    text = data.decode("utf-8-sig")
-    f = io.StringIO(text)
-    reader = csv.DictReader(f)
+    # декодируем потоком, а не весь файл в одну str + копию в StringIO
+    f = io.TextIOWrapper(BytesIO(data), encoding="utf-8-sig", newline="")
+    sample = f.read(4096)
+    f.seek(0)
+    reader = csv.reader(f, delimiter=detect_delimiter(sample))
+
+    # индексы колонок по заголовку — без dict на каждую строку, как у DictReader
+    header = next(reader, None)
+    if not header:
+        return
+    idx = {name.strip(): i for i, name in enumerate(header)}
+    i_code, i_number = idx.get("list_code"), idx.get("number")
+    if i_code is None or i_number is None:
+        return
+    i_title, i_assignee, i_due = idx.get("title"), idx.get("assignee"), idx.get("due_date")
+
+    def cell(row: list[str], i: int | None) -> str:
+        return row[i] if i is not None and i < len(row) else ""
+
     for row in reader:
-        if not row.get("list_code") or not row.get("number"):
+        code_raw, number_raw = cell(row, i_code), cell(row, i_number)
+        if not code_raw or not number_raw:
             continue
-        list_code = row["list_code"].strip()
-        number = int(row["number"])
-        title = (row.get("title") or "").strip()
-        assignee_raw = (row.get("assignee") or "").strip()
+        list_code = code_raw.strip()
+        number = int(number_raw)
+        title = cell(row, i_title).strip()
+        assignee_raw = cell(row, i_assignee).strip()
         assignee = int(assignee_raw) if assignee_raw else None
-        due_date = _parse_due_date(row.get("due_date"))
+        due_date = _parse_due_date(cell(row, i_due))
 
         yield {
             "list_code": list_code,
@@ -112,7 +145,11 @@ def _normalize_due_date(value: Any) -> str | None:
         return None
 
     # Пробуем несколько форматов, если не вышло — возвращаем как есть
-    for fmt in ("%Y-%m-%d", "%d.%m.%Y", "%d/%m/%Y"):
+    try:
+        return iso_to_date(s).isoformat()
+    except ValueError:
+        pass
+    for fmt in ("%d.%m.%Y", "%d/%m/%Y"):
         try:
             d = datetime.strptime(s, fmt).date()
             return d.isoformat()
@@ -123,7 +160,13 @@ def _normalize_due_date(value: Any) -> str | None:
     return s
 
 
-def parse_problems_xlsx(data: bytes) -> Iterator[Dict[str, object]]:
+# последние разобранные файлы: blake2b(содержимое) -> строки;
+# повторная загрузка того же файла не разбирается заново
+_XLSX_CACHE_SIZE = 8
+_xlsx_cache: OrderedDict[bytes, tuple[Dict[str, object], ...]] = OrderedDict()
+
+
+def parse_problems_xlsx(data: bytes) -> list[Dict[str, object]]:
     """
     Парсер XLSX-файла со списком проблем.
 
@@ -142,8 +185,26 @@ def parse_problems_xlsx(data: bytes) -> Iterator[Dict[str, object]]:
             "due_date": str | None,
         }
     """
-    wb = load_workbook(BytesIO(data), data_only=True)
-    ws = wb.active
+    key = hashlib.blake2b(data, digest_size=16).digest()
+    rows = _xlsx_cache.get(key)
+    if rows is None:
+        # read_only — потоковое чтение листа без построения всех ячеек в памяти
+        wb = load_workbook(BytesIO(data), data_only=True, read_only=True)
+        try:
+            rows = tuple(_iter_problem_rows(wb.active))
+        finally:
+            # в read_only режиме книга держит zip открытым до close()
+            wb.close()
+        _xlsx_cache[key] = rows
+        if len(_xlsx_cache) > _XLSX_CACHE_SIZE:
+            _xlsx_cache.popitem(last=False)
+    else:
+        _xlsx_cache.move_to_end(key)
+    # копии строк: вызывающий код может их менять, кэш — нет
+    return [dict(r, assignees=list(r["assignees"])) for r in rows]
+
+
+def _iter_problem_rows(ws) -> Iterator[Dict[str, object]]:
 
     # --- читаем заголовок ---
     header_row = next(ws.iter_rows(min_row=1, max_row=1, values_only=True))
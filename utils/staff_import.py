@@ -1,69 +1,304 @@
+import hashlib
+import posixpath
+import zipfile
+from collections import OrderedDict
+from functools import partial
 from io import BytesIO
-from typing import List, Dict, Any
+from typing import List, Any, BinaryIO, Iterator, Optional, Tuple
 
-from openpyxl import load_workbook
+try:
+    # lxml (есть в зависимостях через docxtpl) — C-шный парсер, и tag= отсекает
+    # ненужные события ещё до Python; без него — stdlib ElementTree
+    from lxml.etree import fromstring, iterparse as _lxml_iterparse
 
+    def _iterparse(f, tag: str) -> Iterator[Any]:
+        for _, elem in _lxml_iterparse(f, events=("end",), tag=tag, resolve_entities=False, no_network=True):
+            yield elem
+            # элемент обработан — очищаем его и отцепляем от родителя вместе с прежними
+            # соседями: иначе пустые <row> копятся в sheetData и память растёт с листом
+            elem.clear()
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+except ImportError:
+    from xml.etree.ElementTree import fromstring, iterparse as _et_iterparse
 
-def parse_staff_xlsx(data: bytes) -> List[Dict[str, Any]]:
+    def _iterparse(f, tag: str) -> Iterator[Any]:
+        # у ElementTree нет getparent() — родителей держим стеком по событиям start/end
+        stack: list[Any] = []
+        for event, elem in _et_iterparse(f, events=("start", "end")):
+            if event == "start":
+                stack.append(elem)
+                continue
+            stack.pop()
+            if elem.tag == tag:
+                yield elem
+                elem.clear()
+                if stack:
+                    # прежние элементы уже удалены — это единственный ребёнок, remove() дешёвый
+                    stack[-1].remove(elem)
+
+# XLSX читаем напрямую: zip + потоковый разбор XML листа.
+# Из файла нужны 1–3 колонки, объекты Workbook/Cell openpyxl здесь не нужны.
+_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_REL_ID = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id"
+
+_ROW = _NS + "row"
+_C = _NS + "c"
+_V = _NS + "v"
+_IS = _NS + "is"
+_T = _NS + "t"
+_SI = _NS + "si"
+
+
+def _text(elem) -> str:
+    # <si>/<is> — простой <t> или rich text из нескольких <r><t>
+    return "".join(t.text or "" for t in elem.iter(_T))
+
+
+def _active_sheet_path(z: zipfile.ZipFile) -> str:
+    """Путь к XML активного листа (как wb.active в openpyxl)."""
+    wb = fromstring(z.read("xl/workbook.xml"))
+    view = wb.find(f"{_NS}bookViews/{_NS}workbookView")
+    active = int(view.get("activeTab", 0)) if view is not None else 0
+    sheets = wb.find(f"{_NS}sheets")
+    rid = sheets[min(active, len(sheets) - 1)].get(_REL_ID)
+
+    rels = fromstring(z.read("xl/_rels/workbook.xml.rels"))
+    target = next(r.get("Target") for r in rels if r.get("Id") == rid)
+    # Target бывает абсолютным (/xl/...) или относительным от xl/
+    return target.lstrip("/") if target.startswith("/") else posixpath.join("xl", target)
+
+
+class _SharedStrings:
+    """
+    sharedStrings.xml разбирается только при первом обращении к ячейке t="s"
+    в нужной колонке: ID обычно числа, и таблица строк может не понадобиться вовсе.
+    """
+
+    def __init__(self, z: zipfile.ZipFile):
+        self._z = z
+        self._items: list[str] | None = None
+
+    def __getitem__(self, i: int) -> str:
+        if self._items is None:
+            self._items = _shared_strings(self._z)
+        return self._items[i]
+
+
+def _shared_strings(z: zipfile.ZipFile) -> list[str]:
+    try:
+        f = z.open("xl/sharedStrings.xml")
+    except KeyError:
+        return []
+    sst: list[str] = []
+    with f:
+        for elem in _iterparse(f, _SI):
+            sst.append(_text(elem))
+    return sst
+
+
+def _col_index(ref: str) -> int:
+    # "AB12" -> 27 (0-based номер колонки)
+    n = 0
+    for ch in ref:
+        if ch.isdigit():
+            break
+        n = n * 26 + (ord(ch) - 64)
+    return n - 1
+
+
+def _cell_value(c, sst: _SharedStrings) -> Any:
+    t = c.get("t")
+    if t == "inlineStr":
+        is_ = c.find(_IS)
+        return _text(is_) if is_ is not None else None
+    v = c.find(_V)
+    if v is None or v.text is None:
+        return None
+    text = v.text
+    if t == "s":
+        return sst[int(text)]
+    if t == "b":
+        return text == "1"
+    if t in ("str", "e"):
+        return text
+    # число — как openpyxl: с точкой/экспонентой это float, иначе int
+    if "." in text or "E" in text or "e" in text:
+        return float(text)
+    return int(text)
+
+
+def _iter_rows(data: bytes | BinaryIO, wanted: set[int]) -> Iterator[tuple[int, dict[int, Any]]]:
+    """
+    (номер строки, {индекс колонки: значение}) по активному листу.
+    Пустые ячейки в словарь не попадают. Если wanted не пуст — читаются
+    только эти колонки (его можно заполнить по шапке, уже во время обхода).
+    """
+    # один ZipFile на весь разбор; файловый объект (временный файл с загрузкой) — как есть, без копии
+    src = BytesIO(data) if isinstance(data, (bytes, bytearray)) else data
+    with zipfile.ZipFile(src) as z:
+        sst = _SharedStrings(z)
+        with z.open(_active_sheet_path(z)) as f:
+            row_num = 0
+            for elem in _iterparse(f, _ROW):
+                row_num = int(elem.get("r", row_num + 1))
+                values: dict[int, Any] = {}
+                col = -1
+                for c in elem.iter(_C):
+                    ref = c.get("r")
+                    col = _col_index(ref) if ref else col + 1
+                    if wanted and col not in wanted:
+                        continue
+                    value = _cell_value(c, sst)
+                    if value is not None:
+                        values[col] = value
+                # элементы строки освобождает _iterparse, когда цикл пойдёт дальше
+                yield row_num, values
+
+
+# варианты заголовков (в нижнем регистре) -> поле; в реальных файлах шапка бывает по-русски
+HEADER_ALIASES = {
+    "assignee": "assignee",
+    "tg": "assignee",
+    "tg_id": "assignee",
+    "telegram_id": "assignee",
+    "telegram id": "assignee",
+    "post": "post",
+    "должность": "post",
+    "fio": "fio",
+    "фио": "fio",
+    "ф.и.о.": "fio",
+}
+
+
+def _clean(v: Any) -> str | None:
+    # текст из ячейки уже str — лишний str(v) не нужен
+    if type(v) is str:
+        return v.strip()
+    return None if v is None else str(v).strip()
+
+
+_MAX_TG_ID = 2**63 - 1
+EARLY_ABORT_ROWS = 50
+
+# (assignee, post, fio) — кортеж вместо dict на каждую строку
+StaffRow = Tuple[int, Optional[str], Optional[str]]
+
+# последние разобранные файлы: blake2b(содержимое) -> строки;
+# список сотрудников часто перезаливают без изменений
+_STAFF_CACHE_SIZE = 8
+_staff_cache: OrderedDict[bytes, tuple[StaffRow, ...]] = OrderedDict()
+
+
+def parse_staff_xlsx(data: bytes | BinaryIO) -> List[StaffRow]:
     """
     Парсим zakaz.xlsx вида:
       assignee | post | fio
 
-    Возвращает список словарей:
-      {"assignee": int, "post": str | None, "fio": str | None}
+    data — байты файла или открытый бинарный файловый объект.
+
+    Возвращает список кортежей:
+      (assignee: int, post: str | None, fio: str | None)
     """
-    wb = load_workbook(BytesIO(data), data_only=True)
-    ws = wb.active
+    if isinstance(data, (bytes, bytearray)):
+        key = hashlib.blake2b(data, digest_size=16).digest()
+    else:
+        # файл хэшируем потоково и возвращаем в начало — дальше его читает ZipFile
+        key = hashlib.file_digest(data, partial(hashlib.blake2b, digest_size=16)).digest()
+        data.seek(0)
 
-    # читаем шапку
-    header_row = next(ws.iter_rows(min_row=1, max_row=1))
-    cols: dict[str, int] = {}
+    rows = _staff_cache.get(key)
+    if rows is None:
+        rows = tuple(iter_staff_xlsx(data))
+        _staff_cache[key] = rows
+        if len(_staff_cache) > _STAFF_CACHE_SIZE:
+            _staff_cache.popitem(last=False)
+    else:
+        _staff_cache.move_to_end(key)
+    # кортежи строк неизменяемы — достаточно нового списка
+    return list(rows)
 
-    for idx, cell in enumerate(header_row, start=1):
-        if cell.value is None:
-            continue
-        name = str(cell.value).strip().lower()
-        cols[name] = idx
+
+def iter_staff_xlsx(data: bytes | BinaryIO) -> Iterator[StaffRow]:
+    """То же, что parse_staff_xlsx, но строки отдаются по мере разбора листа."""
+    wanted: set[int] = set()
+    rows_iter = _iter_rows(data, wanted)
+
+    # читаем шапку — первая строка листа
+    header: dict[int, Any] = {}
+    for row_num, values in rows_iter:
+        if row_num == 1:
+            header = values
+        break
+
+    cols: dict[str, int] = {}
+    for idx, value in header.items():
+        field = HEADER_ALIASES.get(str(value).strip().lower())
+        # при повторе заголовка берём первую колонку
+        if field is not None and field not in cols:
+            cols[field] = idx + 1
 
     # обязательный столбец — assignee
     if "assignee" not in cols:
         raise ValueError("В файле нет колонки 'assignee' (Telegram ID).")
 
-    # необязательные
-    post_col = cols.get("post")
-    fio_col = cols.get("fio")
+    # индексы колонок считаем один раз; нет колонки — -1, такого ключа в строке не бывает
+    a_i = cols["assignee"] - 1
+    p_i = cols.get("post", 0) - 1
+    f_i = cols.get("fio", 0) - 1
 
-    rows: List[Dict[str, Any]] = []
+    # дальше читаем только эти колонки — строки из остальных не разбираются
+    wanted.update(i for i in (a_i, p_i, f_i) if i >= 0)
 
-    for row in ws.iter_rows(min_row=2):
-        # assignee
-        cell_ass = row[cols["assignee"] - 1].value
-        if cell_ass is None:
+    posts: dict[str, str] = {}
+    # сколько строк с заполненной ячейкой assignee прочитано и сколько из них дали корректный ID;
+    # строки только с post/fio (заголовки разделов, примечания) не считаются
+    seen = valid = 0
+
+    for row_num, row in rows_iter:
+        if row_num < 2:
             continue
 
-        try:
-            assignee = int(str(cell_ass).strip())
-        except ValueError:
-            # если ID кривой — пропускаем строку
+        # assignee
+        cell_ass = row.get(a_i)
+        if cell_ass is None or (type(cell_ass) is str and not cell_ass.strip()):
             continue
 
-        post = None
-        fio = None
+        # шапку перепутали и в колонке assignee не ID — не дочитываем весь лист до пустого результата
+        if seen == EARLY_ABORT_ROWS and valid == 0:
+            raise ValueError(
+                f"В первых {EARLY_ABORT_ROWS} строках нет ни одного корректного Telegram ID "
+                "в колонке 'assignee' — проверьте заголовки."
+            )
+        seen += 1
 
-        if post_col is not None:
-            v = row[post_col - 1].value
-            post = str(v).strip() if v is not None else None
+        # ID в ячейке обычно уже число — без круга через str;
+        # float из Excel (1.23456789E8) принимаем, только если он целый
+        t = type(cell_ass)
+        if t is int:
+            assignee = cell_ass
+        elif t is float:
+            if not cell_ass.is_integer():
+                continue
+            assignee = int(cell_ass)
+        else:
+            # кривой ID (телефон, "@ник" и т.п.) — пропускаем строку;
+            # цифры проверяем заранее, без исключения из int() на каждую такую строку
+            s = (cell_ass if t is str else str(cell_ass)).strip()
+            digits = s[1:] if s and s[0] in "+-" else s
+            if not digits.isdecimal():
+                continue
+            assignee = int(s)
 
-        if fio_col is not None:
-            v = row[fio_col - 1].value
-            fio = str(v).strip() if v is not None else None
+        # Telegram ID пользователя положителен и помещается в BIGINT колонки staff.assignee
+        if not 0 < assignee <= _MAX_TG_ID:
+            continue
 
-        rows.append(
-            {
-                "assignee": assignee,
-                "post": post,
-                "fio": fio,
-            }
-        )
+        post = _clean(row.get(p_i))
+        if post is not None:
+            # должностей в списке единицы — одинаковые строки держим одним объектом
+            post = posts.setdefault(post, post)
+        fio = _clean(row.get(f_i))
 
-    return rows
\ No newline at end of file
+        valid += 1
+        yield assignee, post, fio
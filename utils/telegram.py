@@ -0,0 +1,135 @@
+import asyncio
+import logging
+from functools import partial
+from time import monotonic
+from typing import Any, Awaitable, Callable, Iterable, TypeVar
+
+from aiogram.exceptions import TelegramAPIError, TelegramBadRequest, TelegramRetryAfter
+from aiogram.types import InlineKeyboardMarkup, Message
+
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Telegram пускает не больше ~30 сообщений в секунду от бота — держим запас
+TG_CONCURRENCY = 25
+TG_RATE = 25  # запросов в секунду на весь процесс (рассылки админам и в группу)
+_tg_sem = asyncio.Semaphore(TG_CONCURRENCY)
+
+
+class _RateLimiter:
+    """
+    Равномерно раздаёт слоты: не больше rate запросов в секунду.
+
+    Общий на все рассылки, поэтому несколько одновременных fan_out
+    вместе не превышают лимит. pause() сдвигает все следующие слоты —
+    после flood control ждут все, а не только получивший RetryAfter.
+    """
+
+    def __init__(self, rate: float):
+        self._interval = 1.0 / rate
+        self._next = 0.0
+
+    async def acquire(self) -> None:
+        now = monotonic()
+        slot = max(now, self._next)
+        self._next = slot + self._interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    def pause(self, seconds: float) -> None:
+        self._next = max(self._next, monotonic() + seconds)
+
+
+_tg_rate = _RateLimiter(TG_RATE)
+
+
+async def tg_call(make_call: Callable[[], Awaitable[T]], retries: int = 1) -> T:
+    """
+    Выполняет запрос к Telegram API; при flood control (TelegramRetryAfter)
+    ждёт retry_after секунд и повторяет запрос (не больше retries раз).
+    Остальные ошибки пробрасываются.
+
+    make_call — фабрика, а не корутина: корутину нельзя await-ить повторно.
+    """
+    while True:
+        try:
+            return await make_call()
+        except TelegramRetryAfter as e:
+            if retries <= 0:
+                raise
+            retries -= 1
+            await asyncio.sleep(e.retry_after)
+
+
+async def tg_safe(make_call: Callable[[], Awaitable[T]]) -> T | None:
+    """
+    Как tg_call, но ошибки Telegram API (бот заблокирован, сообщение удалено и т.п.)
+    только логируются — возвращается None.
+    """
+    try:
+        return await tg_call(make_call)
+    except TelegramAPIError as e:
+        log.warning("Запрос к Telegram не выполнен: %s", e)
+        return None
+
+
+async def _paced(make_call: Callable[[], Awaitable[T]]) -> T:
+    await _tg_rate.acquire()
+    try:
+        return await make_call()
+    except TelegramRetryAfter as e:
+        _tg_rate.pause(e.retry_after)
+        raise
+
+
+async def _bounded(make_call: Callable[[], Awaitable[Any]]) -> Any:
+    async with _tg_sem:
+        # ожидание retry_after занимает слот семафора, а pause() сдвигает
+        # общее расписание — остальные вызовы не добивают лимит дальше;
+        # повторяется только этот запрос, а не весь хендлер
+        return await tg_call(partial(_paced, make_call))
+
+
+async def fan_out(calls: Iterable[Callable[[], Awaitable[Any]]]) -> list[Any]:
+    """
+    Параллельно выполняет запросы к Telegram API
+    (одновременно не больше TG_CONCURRENCY, не чаще TG_RATE в секунду,
+    flood control — через tg_call).
+
+    calls — фабрики запросов (как в tg_call), чтобы запрос можно было повторить.
+    Ошибки не пробрасываются: они логируются и возвращаются
+    в списке результатов на месте соответствующего вызова.
+    """
+    results = await asyncio.gather(*(_bounded(c) for c in calls), return_exceptions=True)
+    for r in results:
+        if isinstance(r, Exception):
+            log.warning("Не удалось доставить сообщение: %s", r)
+    return results
+
+
+async def edit_with_fallback(
+    msg: Message,
+    text: str,
+    reply_markup: InlineKeyboardMarkup | None = None,
+) -> None:
+    """
+    Редактирует подпись, если сообщение с медиа, иначе — текст.
+
+    Если на экране уже ровно этот текст и эта клавиатура — запрос
+    в Telegram не отправляется; "message is not modified" тоже гасится.
+    """
+    caption = msg.caption
+    current = caption if caption is not None else msg.text
+    if current == text and msg.reply_markup == reply_markup:
+        return
+
+    if caption is not None:
+        coro = msg.edit_caption(caption=text, reply_markup=reply_markup)
+    else:
+        coro = msg.edit_text(text, reply_markup=reply_markup)
+    try:
+        await coro
+    except TelegramBadRequest as e:
+        if "message is not modified" not in str(e):
+            raise
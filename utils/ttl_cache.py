@@ -0,0 +1,82 @@
+import asyncio
+from time import monotonic
+from typing import Any, Awaitable, Callable, Generic, Hashable, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class TTLCache(Generic[K, V]):
+    """
+    Небольшой in-process кэш с TTL для результатов корутин.
+
+    Одновременные промахи по одному ключу не дублируют загрузку:
+    первый вызов грузит значение, остальные ждут его на asyncio.Lock.
+
+    Устаревшие записи вычищаются при промахе, не чаще раза в ttl —
+    кэши с ключом по пользователю не растут всё время жизни бота.
+
+    invalidate()/clear() во время загрузки побеждают её: значение,
+    загруженное до сброса, вызывающему возвращается, но в кэш не кладётся.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._data: dict[K, tuple[float, V]] = {}
+        # key -> [lock, сколько вызовов держат или ждут lock, поколение (+1 на каждый сброс ключа)]
+        self._locks: dict[K, list[Any]] = {}
+        self._next_sweep = monotonic() + ttl
+
+    def _sweep(self) -> None:
+        now = monotonic()
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + self.ttl
+        for key in [k for k, (expires, _) in self._data.items() if expires <= now]:
+            del self._data[key]
+
+    def _fresh(self, key: K) -> tuple[bool, Any]:
+        item = self._data.get(key)
+        if item is not None and item[0] > monotonic():
+            return True, item[1]
+        return False, None
+
+    async def get_or_load(self, key: K, loader: Callable[[], Awaitable[V]]) -> V:
+        hit, value = self._fresh(key)
+        if hit:
+            return value
+
+        self._sweep()
+        slot = self._locks.get(key)
+        if slot is None:
+            slot = self._locks[key] = [asyncio.Lock(), 0, 0]
+        slot[1] += 1
+        try:
+            async with slot[0]:
+                # пока ждали lock, значение мог загрузить другой вызов
+                hit, value = self._fresh(key)
+                if hit:
+                    return value
+                gen = slot[2]
+                value = await loader()
+                # пока грузили, ключ сбросили — значение могло устареть, не кэшируем
+                if slot[2] == gen:
+                    self._data[key] = (monotonic() + self.ttl, value)
+                return value
+        finally:
+            # lock убираем, только когда его никто не держит и не ждёт:
+            # иначе новый вызов получил бы свой lock и грузил бы параллельно ожидающим
+            slot[1] -= 1
+            if not slot[1]:
+                del self._locks[key]
+
+    def invalidate(self, key: K) -> None:
+        self._data.pop(key, None)
+        slot = self._locks.get(key)
+        if slot is not None:
+            slot[2] += 1
+
+    def clear(self) -> None:
+        self._data.clear()
+        for slot in self._locks.values():
+            slot[2] += 1